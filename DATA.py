@@ -4,6 +4,32 @@
 import os
 
 BMR_COEFFICIENT = 1.3
+# 减少/增加1kg体重对应的热量（kcal）
+KCAL_PER_KG = 7700
+# 活动水平对应的TDEE系数（TDEE = BMR × 系数）
+ACTIVITY_LEVELS = {
+    "久坐": 1.2,
+    "轻度活动": 1.375,
+    "中度活动": 1.55,
+    "高强度活动": 1.725,
+    "非常活跃": 1.9,
+}
+DEFAULT_ACTIVITY_LEVEL = "轻度活动"
+
+# 蒙特卡洛预测：样本数、输出的分位数（百分位）
+ENSEMBLE_SAMPLES = 500
+ENSEMBLE_PERCENTILES = (5, 25, 50, 75, 95)
+# 计划执行的随机偏差：运动完成的概率、运动强度和热量摄入的变异系数
+ADHERENCE_EXERCISE_PROB = 0.8
+ADHERENCE_EXERCISE_CV = 0.2
+ADHERENCE_CALORIE_CV = 0.1
+# 方案对比：默认比较的每日运动时长（分钟），没有锻炼计划时用的运动类型
+SCENARIO_EXERCISE_MINUTES = (0, 15, 30, 45, 60, 90)
+SCENARIO_DEFAULT_EXERCISE = '散步'
+# 预存预测的天数（预测页滑块的最大值），页面按所选天数截取
+FORECAST_HORIZON_DAYS = 90
+# 进程内缓存的预测条数（按数据/计划/模型/样本数区分）
+FORECAST_CACHE_SIZE = 16
 EXERCISE_Kkcal = {
     '无': 0,   #/分钟
     '散步': 3.6,
@@ -14,10 +40,39 @@ EXERCISE_Kkcal = {
     '篮球': 6.2
 }
 
+# BMI分级标准：偏瘦/正常、正常/超重、超重/肥胖的分界值
+BMI_THRESHOLDS = {
+    'china': (18.5, 24.0, 28.0),
+    'who': (18.5, 25.0, 30.0),
+}
+BMI_STANDARD = os.environ.get("BMI_STANDARD", "china")
+
 MODEL_FILE = "weight_prediction_lstm.h5"
 SCALER_FILE = "scalers.pkl"
 DATA_FILE = "health_data.csv"
 
+# 进程内模型缓存的内存预算（MB），超出时淘汰最久未使用的模型
+MODEL_CACHE_MAX_BYTES = int(os.environ.get("BMI_MODEL_CACHE_MB", "512")) * 1024 * 1024
+# 每个缓存模型除权重外的估算开销（Keras对象、计算图等）
+MODEL_CACHE_ENTRY_OVERHEAD = 2 * 1024 * 1024
+# 进程内缓存的特征表个数（按数据/计划/用户资料的内容指纹区分）
+FEATURE_CACHE_SIZE = 32
+# 后台训练线程数（同时训练的模型数上限）和页面轮询训练进度的间隔（秒）
+TRAINING_WORKERS = int(os.environ.get("BMI_TRAINING_WORKERS", "2"))
+TRAINING_POLL_SECONDS = 2
+# 批量训练（batch_train.py）每个进程的TensorFlow线程数，进程数默认为 CPU核数 / 线程数
+BATCH_TRAINING_THREADS = int(os.environ.get("BMI_BATCH_TRAINING_THREADS", "1"))
+
+# 增量训练：在已有模型上微调的轮数和学习率，以及回放的最少历史窗口数
+WARM_START_EPOCHS = 5
+WARM_START_LEARNING_RATE = 0.0005
+WARM_START_REPLAY_WINDOWS = 64
+# 以下任一条件满足时放弃增量训练、完整重训：
+# 新增数据超过已训练数据的比例；新数据超出原标准化范围的比例；新增Δweight均值偏移的z值
+WARM_START_MAX_NEW_FRACTION = 0.25
+WARM_START_RANGE_TOLERANCE = 0.25
+WARM_START_DRIFT_Z = 3.0
+
 OPENFOODFACTS_API_URL = "https://world.openfoodfacts.org/api/v2/search"
 NUTRIENT_KEYS = {
     'energy-kcal': '能量 (kcal)',
@@ -87,6 +142,10 @@ DIET_FOODS_DATABASE = {
 
 USER_DATA_DIR = "user_data"
 
+# 健康数据存储后端："csv"（快照+追加日志）、"columnar"（列式内存映射）或 "sqlite"（多用户数据库），
+# 按部署通过环境变量选择
+STORAGE_BACKEND = os.environ.get("BMI_STORAGE_BACKEND", "csv")
+
 # 确保用户目录存在
 os.makedirs(USER_DATA_DIR, exist_ok=True)
 
@@ -103,12 +162,31 @@ def get_user_file(username, filename):
 def get_data_file(username=None):
     return get_user_file(username, "health_data.csv")
 
+def get_columnar_dir(username=None):
+    return get_user_file(username, "health_data.cols")
+
+def get_database_file():
+    """所有用户共用的SQLite数据库"""
+    return os.path.join(USER_DATA_DIR, "health_data.sqlite3")
+
 def get_model_file(username=None):
     return get_user_file(username, "weight_prediction_lstm.h5")
 
+def get_numpy_model_file(username=None):
+    """导出的NumPy推理文件（LSTM/Dense权重 + Scaler参数）"""
+    return get_user_file(username, "weight_prediction_lstm.npz")
+
 def get_scaler_file(username=None):
     return get_user_file(username, "scalers.pkl")
 
+def get_model_meta_file(username=None):
+    """模型元数据（训练数据指纹、计划哈希、训练耗时、库版本等）"""
+    return get_user_file(username, "weight_prediction_lstm.json")
+
+def get_forecast_file(username=None):
+    """预存的预测结果（按预测方法和样本数各存一份）"""
+    return get_user_file(username, "forecast.pkl")
+
 # 用户配置文件
 def get_user_config_file(username=None):
 
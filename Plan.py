@@ -1,9 +1,20 @@
 #添加饮食计划和锻炼计划
 
+import threading
+from collections import OrderedDict
+import numpy as np
 import pandas as pd
 import streamlit as st
 import requests
 import DATA
+import fingerprint
+
+# 编译后周计划表的列：每个星期几（行0=周一）的计划值
+SCHEDULE_COLUMNS = ('exercise_kcal', 'calorie_intake', 'protein', 'carbs', 'fat')
+SCHEDULE_CACHE_SIZE = 64
+
+_schedule_cache = OrderedDict()
+_schedule_lock = threading.Lock()
 
 def validate_training_plan(plan_df, start_date, end_date):
     required_cols = ['date', 'exercise_type', 'exercise_time']
@@ -35,29 +46,73 @@ def get_planned_exercise(date, training_plan):
     """根据日期获取计划的运动类型和时间"""
     if training_plan is None or training_plan.empty:
         return 0
-
-    day_of_week = date.dayofweek
-    if day_of_week < len(training_plan):
-        plan = training_plan.iloc[day_of_week % len(training_plan)]
-        # 正确计算：运动强度(kcal/小时) × 时间(小时)
-        return DATA.EXERCISE_Kkcal.get(plan['exercise_type'], 0) * (plan['exercise_time'] )
-    return 0
+    return compile_schedule(training_plan, None)[date.dayofweek, 0]
 
 def get_planned_calories(date, diet_plan):
     """根据日期获取计划的每日热量摄入"""
     if diet_plan.empty:
         return 0
-    # 计算饮食计划的日均热量贡献
-    daily_kcal = diet_plan.apply(
-        lambda r: r['calories'] * (r['quantity'] / 100) * (r['days_per_week'] / 7),
-        axis=1
-    ).sum()
-    return daily_kcal
-
-
+    return compile_schedule(None, diet_plan)[date.dayofweek, 1]
 
-def load_preset_plan(plan_name):
-        """加载预设减脂餐计划"""
+def _compile_training(training_plan):
+    """训练计划 -> 7天的运动消耗：第i行对应星期i，超出计划行数的日子为0"""
+    exercise_kcal = np.zeros(7)
+    if training_plan is None or training_plan.empty:
+        return exercise_kcal
+    plan = training_plan.iloc[:7]
+    # 正确计算：运动强度(kcal/小时) × 时间(小时)
+    kcal = plan['exercise_type'].map(DATA.EXERCISE_Kkcal).fillna(0).astype(float)
+    exercise_kcal[:len(plan)] = kcal.values * pd.to_numeric(plan['exercise_time'], errors='coerce').values
+    return exercise_kcal
+
+def _compile_diet(diet_plan):
+    """饮食计划 -> 日均的热量和三大营养素（与星期几无关）"""
+    if diet_plan is None or diet_plan.empty:
+        return np.zeros(4)
+    # 每样食物按份量和每周天数折算为日均贡献
+    share = (pd.to_numeric(diet_plan['quantity'], errors='coerce') / 100) * \
+            (pd.to_numeric(diet_plan['days_per_week'], errors='coerce') / 7)
+    totals = []
+    for col in ('calories', 'protein', 'carbs', 'fat'):
+        if col not in diet_plan.columns:
+            totals.append(0.0)
+            continue
+        totals.append((pd.to_numeric(diet_plan[col], errors='coerce') * share).sum())
+    return np.array(totals, dtype=float)
+
+def compile_schedule(training_plan, diet_plan) -> np.ndarray:
+    """
+    把训练计划和饮食计划编译为 7×len(SCHEDULE_COLUMNS) 的周计划表，
+    按计划内容指纹缓存，计划不变时不会重复计算
+    """
+    key = (fingerprint.object_fingerprint(training_plan), fingerprint.object_fingerprint(diet_plan))
+    with _schedule_lock:
+        schedule = _schedule_cache.get(key)
+        if schedule is not None:
+            _schedule_cache.move_to_end(key)
+            return schedule
+
+    schedule = np.zeros((7, len(SCHEDULE_COLUMNS)))
+    schedule[:, 0] = _compile_training(training_plan)
+    schedule[:, 1:] = _compile_diet(diet_plan)
+    # 缓存的数组被多个调用方共享，禁止原地修改
+    schedule.setflags(write=False)
+
+    with _schedule_lock:
+        _schedule_cache[key] = schedule
+        while len(_schedule_cache) > SCHEDULE_CACHE_SIZE:
+            _schedule_cache.popitem(last=False)
+    return schedule
+
+def planned_features(dates, training_plan, diet_plan) -> np.ndarray:
+    """任意日期序列的计划值，按星期几从周计划表中一次取出，形状 (len(dates), len(SCHEDULE_COLUMNS))"""
+    day_of_week = pd.DatetimeIndex(dates).dayofweek
+    return compile_schedule(training_plan, diet_plan)[day_of_week]
+
+
+
+def preset_diet_plan(plan_name):
+        """预设减脂餐计划的DataFrame（带每种食物的营养信息）"""
         plan_items = DATA.PRESET_DIET_PLANS[plan_name]
         new_plan_df = pd.DataFrame(plan_items)
 
@@ -72,8 +127,11 @@ def load_preset_plan(plan_name):
                 new_plan_df.at[index, 'fat'] = food_info['fat']
                 new_plan_df.at[index, 'unit'] = food_info['unit']
                 new_plan_df.at[index, 'brand'] = "预设减脂餐"
+        return new_plan_df
 
-        st.session_state.diet_plan = new_plan_df
+def load_preset_plan(plan_name):
+        """加载预设减脂餐计划"""
+        st.session_state.diet_plan = preset_diet_plan(plan_name)
         st.success(f"已加载 {plan_name} 计划！")
         st.rerun()
 
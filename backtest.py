@@ -0,0 +1,271 @@
+#回测：按滚动起点重放每个用户的历史，比较LSTM与简单基线的预测误差、训练耗时、推理延迟和内存峰值
+
+import argparse
+import contextlib
+import json
+import shutil
+import sys
+import tempfile
+import time
+import tracemalloc
+import numpy as np
+import pandas as pd
+import DATA
+import models
+import energy_balance
+import forecast_cache
+import storage
+from user_manager import read_user_inputs
+
+# 报告误差的预测提前天数
+HORIZONS = (7, 14, 28)
+# 第一个回测起点之前至少需要的记录数
+MIN_TRAIN_RECORDS = 30
+# 相邻回测起点间隔的天数
+ORIGIN_STEP = 7
+# 线性趋势基线拟合最近多少条记录
+TREND_WINDOW = 28
+# LSTM预测固定随机种子，回测结果可复现
+LSTM_SEED = 0
+
+
+def forecast_last_value(train, days, context):
+    """基线：保持最后一次记录的体重"""
+    return np.full(days, float(train['weight'].iloc[-1]))
+
+
+def forecast_linear_trend(train, days, context):
+    """基线：对最近 TREND_WINDOW 条记录按日期做线性拟合并外推"""
+    recent = train.tail(TREND_WINDOW)
+    x = (recent['date'] - recent['date'].iloc[-1]).dt.days.values.astype(float)
+    if len(recent) < 2 or np.ptp(x) == 0:
+        return forecast_last_value(train, days, context)
+    slope, intercept = np.polyfit(x, recent['weight'].values.astype(float), 1)
+    return intercept + slope * np.arange(1, days + 1)
+
+
+def forecast_energy_balance(train, days, context):
+    pred = energy_balance.predict_future_energy(train, days, context['training_plan'], context['diet_plan'],
+                                                context['profile'], context['activity_level'])
+    return _prediction_weights(pred)
+
+
+def forecast_lstm(train, days, context):
+    model, scalers = context.get('model') or (None, None)
+    if model is None:
+        return None
+    pred = models.predict_future_lstm(train, model, scalers, days, context['training_plan'], context['diet_plan'],
+                                      profile=context['profile'], smooth=False, seed=LSTM_SEED)
+    return _prediction_weights(pred)
+
+
+def _prediction_weights(pred):
+    if pred.get('status') != 'success':
+        return None
+    return np.array([p['weight'] for p in pred['predictions']], dtype=float)
+
+
+FORECASTERS = {
+    'last_value': forecast_last_value,
+    'linear_trend': forecast_linear_trend,
+    'energy_balance': forecast_energy_balance,
+    'lstm': forecast_lstm,
+}
+
+
+@contextlib.contextmanager
+def scratch_data_dir():
+    """回测训练的模型写到临时目录，不覆盖用户真实的模型文件"""
+    original = DATA.USER_DATA_DIR
+    DATA.USER_DATA_DIR = tempfile.mkdtemp(prefix="bmi_backtest_")
+    try:
+        yield DATA.USER_DATA_DIR
+    finally:
+        shutil.rmtree(DATA.USER_DATA_DIR, ignore_errors=True)
+        DATA.USER_DATA_DIR = original
+
+
+def fit_lstm(train, context):
+    """用起点之前的数据训练（已有模型时增量训练，与线上一致），返回训练耗时（秒）"""
+    started = time.perf_counter()
+    result = models.train_lstm(train, context['training_plan'], context['diet_plan'], context['profile'],
+                               username=context['scratch_user'])
+    seconds = time.perf_counter() - started
+    model, scalers = (models.load_lstm(context['scratch_user']) if result.get('status') == 'success'
+                      else (None, None))
+    context['model'] = (model, scalers)
+    context.setdefault('train_modes', []).append(result.get('mode') or result.get('message'))
+    return seconds
+
+
+def rolling_origins(df, horizon, min_train=MIN_TRAIN_RECORDS, step=ORIGIN_STEP, max_origins=None):
+    """回测起点（训练数据的记录数）：从 min_train 开始每隔 step 天一个，起点之后要留出 horizon 天"""
+    last_date = df['date'].iloc[-1]
+    origins = []
+    next_date = None
+    for i in range(min_train, len(df)):
+        origin_date = df['date'].iloc[i - 1]
+        if origin_date + pd.Timedelta(days=horizon) > last_date:
+            break
+        if next_date is None or origin_date >= next_date:
+            origins.append(i)
+            next_date = origin_date + pd.Timedelta(days=step)
+    return origins[-max_origins:] if max_origins else origins
+
+
+def backtest_user(df, training_plan, diet_plan, profile, activity_level, forecasters=None, horizons=HORIZONS,
+                  min_train=MIN_TRAIN_RECORDS, step=ORIGIN_STEP, max_origins=None, scratch_user="backtest"):
+    """
+    对一个用户做滚动起点回测。
+    返回 {forecaster: {'errors': {h: [(预测, 实际), ...]}, 'latency': [秒...], 'train_seconds': [...], 'peak_bytes': int}}
+    """
+    forecasters = list(forecasters or FORECASTERS)
+    df = df.dropna(subset=['weight']).sort_values('date').reset_index(drop=True)
+    df['date'] = pd.to_datetime(df['date'])
+    horizon = max(horizons)
+    # 同一天多条记录时以最后一条为准
+    actual = df.groupby('date')['weight'].last()
+    context = {'training_plan': training_plan, 'diet_plan': diet_plan, 'profile': profile,
+               'activity_level': activity_level, 'scratch_user': scratch_user}
+
+    results = {name: {'errors': {h: [] for h in horizons}, 'latency': [], 'train_seconds': [], 'peak_bytes': 0}
+               for name in forecasters}
+    for origin in rolling_origins(df, horizon, min_train, step, max_origins):
+        train = df.iloc[:origin].copy()
+        origin_date = train['date'].iloc[-1]
+        if 'lstm' in forecasters:
+            results['lstm']['train_seconds'].append(fit_lstm(train, context))
+
+        for name in forecasters:
+            # 清空预测缓存，测的是完整计算而不是缓存命中
+            forecast_cache.cache.clear()
+            started = time.perf_counter()
+            weights = FORECASTERS[name](train, horizon, context)
+            results[name]['latency'].append(time.perf_counter() - started)
+            if weights is None:
+                continue
+            for h in horizons:
+                target = actual.get(origin_date + pd.Timedelta(days=h))
+                if target is not None:
+                    results[name]['errors'][h].append((weights[h - 1], target))
+
+            # 内存峰值单独测一次：tracemalloc会拖慢计算，不与计时混在一起
+            if not results[name]['peak_bytes']:
+                forecast_cache.cache.clear()
+                tracemalloc.start()
+                FORECASTERS[name](train, horizon, context)
+                results[name]['peak_bytes'] = tracemalloc.get_traced_memory()[1]
+                tracemalloc.stop()
+    return results
+
+
+def summarize(per_user, horizons=HORIZONS):
+    """合并所有用户的回测结果：每个预测方法在各提前天数的MAE/MAPE，以及训练耗时、推理延迟、内存峰值"""
+    summary = {}
+    names = {name for results in per_user for name in results}
+    for name in sorted(names, key=list(FORECASTERS).index):
+        parts = [results[name] for results in per_user if name in results]
+        metrics = {}
+        for h in horizons:
+            pairs = np.array([pair for part in parts for pair in part['errors'][h]], dtype=float).reshape(-1, 2)
+            errors = np.abs(pairs[:, 0] - pairs[:, 1])
+            metrics[str(h)] = {
+                'n': len(errors),
+                'mae': round(float(errors.mean()), 4) if len(errors) else None,
+                'mape': round(float((errors / pairs[:, 1]).mean() * 100), 4) if len(errors) else None,
+            }
+        latency = np.array([t for part in parts for t in part['latency']]) * 1000
+        train_seconds = [t for part in parts for t in part['train_seconds']]
+        summary[name] = {
+            'horizons': metrics,
+            'latency_ms': {
+                'median': round(float(np.median(latency)), 3) if len(latency) else None,
+                'p95': round(float(np.percentile(latency, 95)), 3) if len(latency) else None,
+            },
+            'train_seconds': {
+                'total': round(sum(train_seconds), 2),
+                'mean': round(float(np.mean(train_seconds)), 2) if train_seconds else None,
+            },
+            'peak_memory_mb': round(max(part['peak_bytes'] for part in parts) / 1024 / 1024, 3),
+        }
+    return summary
+
+
+def find_regressions(summary, previous, tolerance):
+    """与之前的回测结果比较，误差或推理延迟变差超过 tolerance（比例）的项"""
+    regressions = []
+    for name, current in summary.items():
+        before = previous.get(name)
+        if before is None:
+            continue
+        for h, metrics in current['horizons'].items():
+            old = before['horizons'].get(h, {}).get('mae')
+            if old and metrics['mae'] is not None and metrics['mae'] > old * (1 + tolerance):
+                regressions.append(f"{name} {h}天MAE {old} -> {metrics['mae']}")
+        old = before['latency_ms'].get('median')
+        new = current['latency_ms']['median']
+        if old and new is not None and new > old * (1 + tolerance):
+            regressions.append(f"{name} 推理延迟中位数 {old}ms -> {new}ms")
+    return regressions
+
+
+def print_table(summary, horizons=HORIZONS):
+    header = ["方法"] + [f"{h}天MAE/MAPE" for h in horizons] + ["延迟中位数(ms)", "训练(s)", "内存峰值(MB)"]
+    print(" | ".join(header))
+    for name, result in summary.items():
+        cells = [name]
+        for h in horizons:
+            m = result['horizons'][str(h)]
+            cells.append("-" if m['mae'] is None else f"{m['mae']:.3f}/{m['mape']:.2f}%")
+        cells += [str(result['latency_ms']['median']), str(result['train_seconds']['total']),
+                  str(result['peak_memory_mb'])]
+        print(" | ".join(cells))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="滚动起点回测：比较各预测方法的误差和性能")
+    parser.add_argument("--users", nargs="*", help="只回测指定用户（默认全部）")
+    parser.add_argument("--forecasters", nargs="*", choices=list(FORECASTERS), default=list(FORECASTERS))
+    parser.add_argument("--horizons", nargs="*", type=int, default=list(HORIZONS), help="报告误差的提前天数")
+    parser.add_argument("--step", type=int, default=ORIGIN_STEP, help="相邻回测起点间隔的天数")
+    parser.add_argument("--max-origins", type=int, help="每个用户最多回测最近的多少个起点（LSTM每个起点都要训练）")
+    parser.add_argument("--json", help="把汇总结果写入该JSON文件")
+    parser.add_argument("--compare", help="与之前的回测JSON比较，有退化时返回非0")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="允许的退化比例（默认0.2）")
+    args = parser.parse_args(argv)
+
+    # 先读出所有用户的数据，再切换到临时目录训练
+    inputs = {}
+    for username in args.users or storage.list_users():
+        df, training_plan, diet_plan, config = read_user_inputs(username)
+        if df is not None and df['weight'].dropna().size >= MIN_TRAIN_RECORDS + min(args.horizons):
+            inputs[username] = (df, training_plan, diet_plan, models.profile_from_config(config),
+                                config.get('user_activity_level', DATA.DEFAULT_ACTIVITY_LEVEL))
+
+    started = time.perf_counter()
+    per_user = []
+    with scratch_data_dir():
+        for username, (df, training_plan, diet_plan, profile, activity_level) in inputs.items():
+            per_user.append(backtest_user(df, training_plan, diet_plan, profile, activity_level,
+                                          args.forecasters, tuple(args.horizons), step=args.step,
+                                          max_origins=args.max_origins, scratch_user=username))
+
+    summary = summarize(per_user, tuple(args.horizons))
+    print(f"回测 {len(per_user)} 个用户，耗时 {time.perf_counter() - started:.1f}s")
+    print_table(summary, tuple(args.horizons))
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump({'users': len(per_user), 'forecasters': summary}, f, ensure_ascii=False, indent=2)
+
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            previous = json.load(f)['forecasters']
+        regressions = find_regressions(summary, previous, args.tolerance)
+        for line in regressions:
+            print(f"退化: {line}")
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,185 @@
+#批量训练：离线扫描所有用户，多进程并行训练需要更新的模型（适合夜间定时任务）
+
+import argparse
+import json
+import multiprocessing
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import DATA
+import ml_backend
+import storage
+import models
+import model_meta
+import feature_cache
+import forecast_store
+from user_manager import read_user_inputs
+
+# 与 train_lstm 一致：至少需要序列长度+1条记录
+MIN_RECORDS = 8
+
+
+def load_training_inputs(username):
+    """读取用户的健康数据、训练计划、饮食计划和用户资料"""
+    df, training_plan, diet_plan, config = read_user_inputs(username)
+    return df, training_plan, diet_plan, models.profile_from_config(config)
+
+
+def training_decision(username, force=False):
+    """判断用户是否需要训练，返回 (是否训练, 原因)"""
+    df, training_plan, diet_plan, profile = load_training_inputs(username)
+    if df is None or df['weight'].dropna().size < MIN_RECORDS:
+        return False, f"数据不足{MIN_RECORDS}条"
+    if force:
+        return True, "强制训练"
+    if not os.path.exists(DATA.get_model_file(username)):
+        return True, "没有模型"
+    if model_meta.is_fresh(username, feature_cache.feature_key(df, training_plan, diet_plan, profile)):
+        return False, "模型已是最新"
+    return True, "数据或计划已变化"
+
+
+def _init_worker(threads):
+    # 每个进程在导入TensorFlow之前限制线程数，多个进程合起来正好占满CPU
+    ml_backend.limit_threads(threads)
+
+
+def precompute_forecast(username):
+    """预算一个用户的预测，返回 (耗时秒数, 错误信息)，异常不向外抛出"""
+    started = time.perf_counter()
+    try:
+        forecast_store.precompute_user(username)
+        error = None
+    except Exception as e:
+        error = f"{type(e).__name__}: {e}"
+    return round(time.perf_counter() - started, 2), error
+
+
+def train_user(username, warm_start=True, force=False, forecast=True):
+    """
+    在工作进程中训练一个用户的模型，返回结果摘要（异常也作为失败结果返回）。
+    forecast=True 时训练完成后接着预算该用户的预测，预测页打开时直接读取；预测耗时单独统计
+    """
+    started = time.perf_counter()
+    try:
+        df, training_plan, diet_plan, profile = load_training_inputs(username)
+        result = models.train_lstm(df, training_plan, diet_plan, profile, username=username,
+                                   warm_start=warm_start, force=force)
+    except Exception as e:
+        result = {"status": "error", "message": f"{type(e).__name__}: {e}"}
+    seconds = round(time.perf_counter() - started, 2)
+    forecast_seconds, forecast_error = (precompute_forecast(username)
+                                        if forecast and result.get('status') == 'success' else (0.0, None))
+    return {
+        'username': username,
+        'status': result.get('status'),
+        'mode': result.get('mode'),
+        'message': result.get('message') or result.get('reason'),
+        'seconds': seconds,
+        'forecast_seconds': forecast_seconds,
+        'forecast_error': forecast_error,
+    }
+
+
+def forecast_user(username, reason):
+    """在工作进程中只预算预测（模型不用训练，但数据以外的输入如活动水平变化后预测仍需更新）"""
+    forecast_seconds, forecast_error = precompute_forecast(username)
+    return {'username': username, 'status': 'skipped', 'mode': None, 'message': reason, 'seconds': 0.0,
+            'forecast_seconds': forecast_seconds, 'forecast_error': forecast_error}
+
+
+def run(usernames=None, workers=None, threads=None, warm_start=True, force=False, forecast=True, log=print):
+    """训练所有需要训练的用户，返回汇总结果"""
+    threads = threads or DATA.BATCH_TRAINING_THREADS
+    workers = workers or max(1, (os.cpu_count() or 1) // threads)
+    started = time.perf_counter()
+
+    results, pending, forecast_only = [], [], []
+    for username in usernames or storage.list_users():
+        try:
+            needed, reason = training_decision(username, force)
+        except Exception as e:
+            # 单个用户的数据损坏不影响其他用户
+            results.append({'username': username, 'status': 'error', 'mode': None,
+                            'message': f"{type(e).__name__}: {e}", 'seconds': 0.0,
+                            'forecast_seconds': 0.0, 'forecast_error': None})
+            continue
+        if needed:
+            pending.append(username)
+        elif forecast:
+            forecast_only.append((username, reason))
+        else:
+            results.append({'username': username, 'status': 'skipped', 'mode': None, 'message': reason,
+                            'seconds': 0.0, 'forecast_seconds': 0.0, 'forecast_error': None})
+    log(f"共 {len(results) + len(pending) + len(forecast_only)} 个用户，需要训练 {len(pending)} 个，"
+        f"只预算预测 {len(forecast_only)} 个，{workers} 个进程 × {threads} 线程")
+
+    jobs = len(pending) + len(forecast_only)
+    if jobs:
+        # spawn：工作进程从头导入，不继承父进程的TensorFlow/线程状态
+        with ProcessPoolExecutor(max_workers=min(workers, jobs),
+                                 mp_context=multiprocessing.get_context("spawn"),
+                                 initializer=_init_worker, initargs=(threads,)) as executor:
+            # 训练任务先提交，只预算预测的任务不会推迟训练
+            futures = [executor.submit(train_user, username, warm_start, force, forecast) for username in pending]
+            futures += [executor.submit(forecast_user, username, reason) for username, reason in forecast_only]
+            for future in as_completed(futures):
+                result = future.result()
+                results.append(result)
+                log(f"[{result['status']}] {result['username']} {result['mode'] or ''} "
+                    f"{result['seconds']:.1f}s {result['message'] or ''}"
+                    + (f" 预测失败: {result['forecast_error']}" if result['forecast_error'] else ""))
+
+    trained = [r for r in results if r['status'] == 'success']
+    return {
+        'users': len(results),
+        'trained': len(trained),
+        'skipped': sum(r['status'] == 'skipped' for r in results),
+        'failed': sum(r['status'] == 'error' for r in results),
+        'forecast_failed': sum(r['forecast_error'] is not None for r in results),
+        'workers': workers,
+        'threads_per_worker': threads,
+        'wall_seconds': round(time.perf_counter() - started, 2),
+        'training_seconds': round(sum(r['seconds'] for r in trained), 2),
+        'forecast_seconds': round(sum(r['forecast_seconds'] for r in results), 2),
+        'results': sorted(results, key=lambda r: r['username']),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="批量训练所有需要更新的用户模型")
+    parser.add_argument("--users", nargs="*", help="只训练指定用户（默认全部）")
+    parser.add_argument("--workers", type=int, help="并行训练的进程数（默认 CPU核数 / 每进程线程数）")
+    parser.add_argument("--threads", type=int, help=f"每个进程的TensorFlow线程数（默认 {DATA.BATCH_TRAINING_THREADS}）")
+    parser.add_argument("--force", action="store_true", help="模型已是最新也重新训练")
+    parser.add_argument("--no-warm-start", action="store_true", help="不做增量训练，全部完整重训")
+    parser.add_argument("--no-forecast", action="store_true", help="训练后不预算预测结果")
+    parser.add_argument("--dry-run", action="store_true", help="只列出需要训练的用户")
+    parser.add_argument("--json", help="把汇总结果写入该JSON文件")
+    args = parser.parse_args(argv)
+
+    if args.dry_run:
+        failed = 0
+        for username in args.users or storage.list_users():
+            try:
+                needed, reason = training_decision(username, args.force)
+            except Exception as e:
+                print(f"失败 {username}: {type(e).__name__}: {e}")
+                failed += 1
+                continue
+            print(f"{'训练' if needed else '跳过'} {username}: {reason}")
+        return 1 if failed else 0
+
+    summary = run(args.users, args.workers, args.threads, not args.no_warm_start, args.force, not args.no_forecast)
+    print(f"完成：训练 {summary['trained']}，跳过 {summary['skipped']}，失败 {summary['failed']}，"
+          f"预测失败 {summary['forecast_failed']}；总耗时 {summary['wall_seconds']:.1f}s"
+          f"（训练累计 {summary['training_seconds']:.1f}s，预测累计 {summary['forecast_seconds']:.1f}s）")
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(summary, f, ensure_ascii=False, indent=2)
+    return 1 if summary['failed'] or summary['forecast_failed'] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,184 @@
+#热点路径基准：在合成用户数据上测量数据加载、特征构建、训练、预测、保存和绘图的耗时，输出JSON便于跨提交比较
+
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# 历史天数：从一个月到十年
+SIZES = (30, 365, 3 * 365, 10 * 365)
+# 预测天数
+PREDICT_DAYS = 28
+
+
+def measure(fn, repeat, setup=None):
+    """重复执行 fn（每次之前先执行 setup，不计时），返回最快和中位耗时（秒）"""
+    times = []
+    for _ in range(repeat):
+        if setup is not None:
+            setup()
+        start = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - start)
+    return {'best': round(min(times), 5), 'median': round(statistics.median(times), 5)}
+
+
+def login(username):
+    """按登录流程把用户资料和数据载入 session_state（bare模式下 session_state 是进程内字典）"""
+    import streamlit as st
+    from user_manager import UserManager
+    manager = UserManager()
+    manager.login(username)
+    if 'target_weight' not in st.session_state:
+        st.session_state.target_weight = None
+    return manager
+
+
+def bench_size(days, repeat, train=True, seed=0):
+    """生成一个 days 天历史的用户，测量各热点路径"""
+    import pandas as pd
+    import streamlit as st
+    import DATA
+    import models
+    import feature_cache
+    import forecast_cache
+    import draw_picture
+    import synthetic_users
+    import numpy as np
+
+    username = f"bench{days}"
+    synthetic_users.create_population(1, days, seed=seed, prefix=username)
+    username += "0000"
+    manager = login(username)
+    df = st.session_state.df
+    training_plan = st.session_state.get('user_training_plan')
+    diet_plan = st.session_state.get('diet_plan')
+    profile = models.session_profile()
+
+    results = {'rows': len(df)}
+    results['load_data'] = measure(models.load_data, repeat)
+    results['ensure_schema'] = measure(lambda: models.ensure_schema(df.copy()), repeat)
+    results['build_training_frame'] = measure(
+        lambda: models.build_training_frame(df, training_plan, diet_plan, profile), repeat,
+        setup=feature_cache.cache.clear)
+
+    if train:
+        results['train_lstm'] = measure(
+            lambda: models.train_lstm(df, training_plan, diet_plan, profile, username=username,
+                                      warm_start=False, force=True), 1)
+        results['train_lstm_warm_start'] = measure(
+            lambda: models.train_lstm(df, training_plan, diet_plan, profile, username=username, force=True), 1)
+
+    pred = None
+    model, scalers = models.load_lstm(username)
+    if model is not None:
+        def predict(samples=0):
+            nonlocal pred
+            pred = models.predict_future_lstm(df, model, scalers, PREDICT_DAYS, training_plan, diet_plan,
+                                              profile=profile, samples=samples)
+        results['predict_future_lstm'] = measure(predict, repeat, setup=forecast_cache.cache.clear)
+        results['predict_future_lstm_ensemble'] = measure(lambda: predict(DATA.ENSEMBLE_SAMPLES), repeat,
+                                                          setup=forecast_cache.cache.clear)
+
+    # 新增一条记录（只追加）和整体重写两种保存
+    def add_record():
+        last = st.session_state.df.iloc[-1]
+        record = pd.DataFrame([{'date': last['date'] + pd.Timedelta(days=1), 'weight': last['weight'],
+                                'height': last['height'], 'exercise_type': "无", 'exercise_time': 0.0,
+                                'calorie_intake': np.nan}])
+        st.session_state.df = pd.concat([st.session_state.df, record], ignore_index=True)
+    results['save_user_data_append'] = measure(manager.save_user_data, repeat, setup=add_record)
+    results['save_user_data_full'] = measure(lambda: manager.save_user_data(force=True), repeat)
+
+    def clear_figures():
+        st.session_state.figure_cache = {}
+    results['plot_weight_trend'] = measure(lambda: draw_picture.plot_weight_trend(df), repeat, setup=clear_figures)
+    results['plot_calorie_balance'] = measure(lambda: draw_picture.plot_calorie_balance(df), repeat,
+                                              setup=clear_figures)
+    if pred is not None and pred.get('status') == 'success':
+        results['plot_history_with_prediction'] = measure(
+            lambda: draw_picture.plot_history_with_prediction(df, pred), repeat)
+    return results
+
+
+def git_commit():
+    try:
+        out = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True, text=True)
+        return out.stdout.strip() or None
+    except OSError:
+        return None
+
+
+def run_child(days, repeat, train):
+    # 每个数据规模在新进程中测量，互不影响缓存和内存
+    args = [sys.executable, __file__, "--child", str(days), "--repeat", str(repeat)]
+    if not train:
+        args.append("--no-train")
+    out = subprocess.run(args, capture_output=True, text=True, check=True)
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+
+def find_regressions(results, previous, tolerance):
+    """与之前的基准结果比较，最快耗时变慢超过 tolerance（比例）的项"""
+    regressions = []
+    for size, ops in results.items():
+        for op, timing in ops.items():
+            old = previous.get(size, {}).get(op)
+            if isinstance(timing, dict) and old and timing['best'] > old['best'] * (1 + tolerance):
+                regressions.append(f"{size}天 {op}: {old['best']}s -> {timing['best']}s")
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="热点路径耗时基准（合成数据）")
+    parser.add_argument("--sizes", nargs="*", type=int, default=list(SIZES), help="用户历史天数")
+    parser.add_argument("--repeat", type=int, default=5, help="每项重复测量次数（训练只测一次）")
+    parser.add_argument("--no-train", action="store_true", help="不测量模型训练（也就没有预测）")
+    parser.add_argument("--json", help="把结果写入该JSON文件")
+    parser.add_argument("--compare", help="与之前的基准JSON比较，有变慢时返回非0")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="允许的变慢比例（默认0.25）")
+    parser.add_argument("--child", type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.child is not None:
+        sys.path.insert(0, ROOT)
+        # 在临时目录中运行，避免在仓库里生成user_data
+        os.chdir(tempfile.mkdtemp(prefix="bmi_bench_"))
+        import matplotlib
+        matplotlib.use("Agg")
+        import streamlit.logger
+        streamlit.logger.set_log_level("error")
+        print(json.dumps(bench_size(args.child, args.repeat, not args.no_train)))
+        return 0
+
+    result = {
+        'benchmark': 'hot_paths',
+        'commit': git_commit(),
+        'python': platform.python_version(),
+        'repeat': args.repeat,
+        'results': {str(days): run_child(days, args.repeat, not args.no_train) for days in args.sizes},
+    }
+    print(json.dumps(result, ensure_ascii=False, indent=2))
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(result, f, ensure_ascii=False, indent=2)
+
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            previous = json.load(f)['results']
+        regressions = find_regressions(result['results'], previous, args.tolerance)
+        for line in regressions:
+            print(f"变慢: {line}", file=sys.stderr)
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,80 @@
+#启动耗时基准：渲染登录页所需时间，并检查期间没有加载TensorFlow/scikit-learn
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+MAIN_FILE = os.path.join(ROOT, "main.py")
+
+
+def measure_login_page():
+    """在当前（全新的）进程中渲染登录页，返回耗时和已加载的重量级模块"""
+    sys.path.insert(0, ROOT)
+    # 在临时目录中运行，避免在仓库里生成user_data
+    os.chdir(tempfile.mkdtemp(prefix="bmi_bench_"))
+
+    start = time.perf_counter()
+    from streamlit.testing.v1 import AppTest
+    app = AppTest.from_file(MAIN_FILE, default_timeout=120)
+    app.run()
+    elapsed = time.perf_counter() - start
+
+    import ml_backend
+    return {
+        'login_page_seconds': round(elapsed, 4),
+        'exceptions': [str(e.value) for e in app.exception],
+        'heavy_modules_loaded': ml_backend.loaded_modules(),
+    }
+
+
+def measure_tensorflow_import():
+    """单独导入TensorFlow的耗时，作为对照"""
+    start = time.perf_counter()
+    import tensorflow  # noqa: F401
+    return {'tensorflow_import_seconds': round(time.perf_counter() - start, 4)}
+
+
+def run_child(mode):
+    # 每次测量都在新进程中进行，保证是冷启动
+    out = subprocess.run([sys.executable, __file__, "--child", mode],
+                         capture_output=True, text=True, check=True)
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="登录页冷启动耗时基准")
+    parser.add_argument("--repeat", type=int, default=3, help="重复测量次数")
+    parser.add_argument("--compare", action="store_true", help="同时测量单独导入TensorFlow的耗时")
+    parser.add_argument("--child", choices=["login", "tensorflow"], help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.child == "login":
+        print(json.dumps(measure_login_page()))
+        return 0
+    if args.child == "tensorflow":
+        print(json.dumps(measure_tensorflow_import()))
+        return 0
+
+    runs = [run_child("login") for _ in range(args.repeat)]
+    result = {
+        'benchmark': 'login_page_cold_start',
+        'runs': [r['login_page_seconds'] for r in runs],
+        'best_seconds': min(r['login_page_seconds'] for r in runs),
+        'heavy_modules_loaded': sorted({m for r in runs for m in r['heavy_modules_loaded']}),
+        'exceptions': sorted({e for r in runs for e in r['exceptions']}),
+    }
+    if args.compare:
+        result.update(run_child("tensorflow"))
+    print(json.dumps(result, ensure_ascii=False, indent=2))
+
+    # 登录页加载了重量级模块或渲染出错都视为失败
+    return 1 if result['heavy_modules_loaded'] or result['exceptions'] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
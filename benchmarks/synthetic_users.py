@@ -0,0 +1,155 @@
+#合成用户数据：按能量平衡生成多年的每日体重、运动和饮食记录，写成 DATA.USER_DATA_DIR 的目录结构，供基准测试和回测使用
+
+import argparse
+import os
+import pickle
+import sys
+
+import numpy as np
+import pandas as pd
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+import DATA  # noqa: E402
+import Plan  # noqa: E402
+import bmi_calculation  # noqa: E402
+import storage  # noqa: E402
+
+# 每个阶段（减脂/维持/反弹）持续的天数范围
+PHASE_DAYS = (30, 120)
+# 各阶段相对维持热量的每日热量差（kcal）和运动概率
+PHASES = {
+    'cut': (-500, 0.6),
+    'maintain': (0, 0.4),
+    'regain': (300, 0.2),
+}
+# 合理的BMI范围：低于下限不再减脂，高于上限不再反弹
+BMI_RANGE = (19.0, 33.0)
+# 没有记录的天的比例
+MISSING_DAY_RATE = 0.08
+# 有记录但没填摄入的比例
+MISSING_INTAKE_RATE = 0.05
+
+
+def random_profile(rng):
+    """随机的用户资料（身高、性别、年龄、活动水平）"""
+    sex = rng.choice(["男", "女"])
+    return {
+        'user_height': round(float(rng.normal(175 if sex == "男" else 162, 6)), 1),
+        'user_sex': str(sex),
+        'user_age': int(rng.integers(18, 65)),
+        'user_activity_level': str(rng.choice(list(DATA.ACTIVITY_LEVELS))),
+    }
+
+
+def generate_history(days, profile, rng, start_date="2015-01-01"):
+    """
+    生成 days 天的健康记录：按阶段切换减脂/维持/反弹，每天的摄入围绕当天的维持热量波动，
+    体重按能量平衡逐日累积，记录值再叠加水分波动；随机缺失部分天和部分摄入
+    """
+    height = profile['user_height']
+    bmi = rng.uniform(20, 32)
+    weight = bmi * (height / 100) ** 2
+    activity = DATA.ACTIVITY_LEVELS[profile['user_activity_level']]
+    bmr_base = float(bmi_calculation.calculate_bmr_array(0.0, height, profile['user_age'], profile['user_sex']))
+    exercise_types = [name for name in DATA.EXERCISE_Kkcal if DATA.EXERCISE_Kkcal[name] > 0]
+    dates = pd.date_range(start_date, periods=days, freq='D')
+
+    weights = np.empty(days)
+    intake = np.empty(days)
+    exercise_type = np.empty(days, dtype=object)
+    exercise_time = np.zeros(days)
+    phase_end = 0
+    for day in range(days):
+        if day >= phase_end:
+            bmi = weight / (height / 100) ** 2
+            phases = [name for name in PHASES if not (name == 'cut' and bmi < BMI_RANGE[0])
+                      and not (name == 'regain' and bmi > BMI_RANGE[1])]
+            deficit, exercise_rate = PHASES[rng.choice(phases)]
+            phase_end = day + int(rng.integers(*PHASE_DAYS))
+        if rng.random() < exercise_rate:
+            exercise_type[day] = rng.choice(exercise_types)
+            exercise_time[day] = float(rng.integers(4, 16) * 5)
+        else:
+            exercise_type[day] = "无"
+        burned = DATA.EXERCISE_Kkcal[exercise_type[day]] * exercise_time[day]
+
+        maintenance = (10 * weight + bmr_base) * activity
+        # 运动消耗会被多吃回来，阶段的热量差决定体重走向；周末吃得多一些
+        weekend = 250 if dates[day].dayofweek >= 5 else 0
+        intake[day] = max(800.0, maintenance + burned + deficit + weekend + rng.normal(0, 200))
+        weight += (intake[day] - maintenance - burned) / DATA.KCAL_PER_KG
+        weights[day] = weight
+
+    df = pd.DataFrame({
+        'date': dates,
+        # 称重值包含水分等日常波动
+        'weight': (weights + rng.normal(0, 0.35, days)).round(1),
+        'height': height,
+        'exercise_type': exercise_type,
+        'exercise_time': exercise_time,
+        # 记录的摄入通常偏低
+        'calorie_intake': (intake * rng.normal(0.92, 0.06, days)).round(0),
+    })
+    df.loc[rng.random(days) < MISSING_INTAKE_RATE, 'calorie_intake'] = np.nan
+    keep = rng.random(days) >= MISSING_DAY_RATE
+    # 保留最后一天，预测总是从最新记录开始
+    keep[-1] = True
+    return df[keep].reset_index(drop=True)
+
+
+def random_plans(rng):
+    """约一半用户有训练计划、一半用户有饮食计划，覆盖有/无计划两条代码路径"""
+    training_plan = None
+    if rng.random() < 0.5:
+        training_plan = pd.DataFrame({
+            'exercise_type': ["跑步", "散步", "游泳"],
+            'exercise_time': [30.0, 45.0, 40.0],
+            'days_per_week': [3, 2, 1],
+        })
+    diet_plan = Plan.preset_diet_plan(rng.choice(list(DATA.PRESET_DIET_PLANS))) if rng.random() < 0.5 else None
+    return training_plan, diet_plan
+
+
+def create_user(username, days, rng, plans=True):
+    """在当前 DATA.USER_DATA_DIR 下创建一个合成用户（用户配置 + 健康数据），返回健康数据"""
+    profile = random_profile(rng)
+    training_plan, diet_plan = random_plans(rng) if plans else (None, None)
+    config = dict(profile, user_training_plan=training_plan, diet_plan=diet_plan)
+    with open(DATA.get_user_config_file(username), "wb") as f:
+        pickle.dump(config, f)
+    df = generate_history(days, profile, rng)
+    storage.get_store().save(username, df)
+    return df
+
+
+def create_population(n_users, days, seed=0, prefix="user", plans=True):
+    """创建 n_users 个合成用户，每人 days 天历史；同样的 seed 生成同样的数据，返回用户名列表"""
+    rng = np.random.default_rng(seed)
+    usernames = [f"{prefix}{i:04d}" for i in range(n_users)]
+    for username in usernames:
+        create_user(username, days, rng, plans)
+    return usernames
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="生成合成用户数据")
+    parser.add_argument("--users", type=int, default=10, help="用户数")
+    parser.add_argument("--days", type=int, default=3 * 365, help="每个用户的历史天数")
+    parser.add_argument("--data-dir", help=f"用户数据目录（默认 {DATA.USER_DATA_DIR}）")
+    parser.add_argument("--seed", type=int, default=0, help="随机种子")
+    parser.add_argument("--prefix", default="user", help="用户名前缀")
+    parser.add_argument("--no-plans", action="store_true", help="不生成训练计划和饮食计划")
+    args = parser.parse_args(argv)
+
+    if args.data_dir:
+        DATA.USER_DATA_DIR = args.data_dir
+    usernames = create_population(args.users, args.days, args.seed, args.prefix, not args.no_plans)
+    print(f"已在 {DATA.USER_DATA_DIR} 生成 {len(usernames)} 个用户，每人 {args.days} 天")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -3,6 +3,22 @@
 from typing import Tuple
 import pandas as pd
 import numpy as np
+import DATA
+
+# 分类编码 0~3 对应的类别和建议，编码 -1 表示无法分类
+BMI_CATEGORIES = ["偏瘦", "正常", "超重", "肥胖"]
+BMI_ADVICE = [
+    "建议适当增加热量摄入，保持均衡饮食，适度运动增强体质。",
+    "恭喜！您的体重处于健康范围，请保持良好的饮食和运动习惯。",
+    "建议控制热量摄入，增加运动量，减少高脂肪、高糖食物的摄入。",
+    "建议咨询医生或营养师，制定科学的减重计划，增加有氧运动，严格控制饮食。",
+]
+UNKNOWN_CATEGORY = "未知"
+UNKNOWN_ADVICE = "请检查身高/体重输入是否有效。"
+
+# 查找表末尾放"未知"，编码 -1 正好取到最后一项
+_CATEGORY_TABLE = np.array(BMI_CATEGORIES + [UNKNOWN_CATEGORY], dtype=object)
+_ADVICE_TABLE = np.array(BMI_ADVICE + [UNKNOWN_ADVICE], dtype=object)
 
 def calculate_bmi(weight: float, height_cm: float) -> float:
     height_m = height_cm / 100.0
@@ -10,17 +26,35 @@ def calculate_bmi(weight: float, height_cm: float) -> float:
         return np.nan
     return round(weight / (height_m ** 2), 1)
 
-def get_bmi_category(bmi: float) -> Tuple[str, str]:
-    if pd.isna(bmi):
-        return "未知", "请检查身高/体重输入是否有效。"
-    if bmi < 18.5:
-        return "偏瘦", "建议适当增加热量摄入，保持均衡饮食，适度运动增强体质。"
-    elif 18.5 <= bmi < 24:
-        return "正常", "恭喜！您的体重处于健康范围，请保持良好的饮食和运动习惯。"
-    elif 24 <= bmi < 28:
-        return "超重", "建议控制热量摄入，增加运动量，减少高脂肪、高糖食物的摄入。"
-    else:
-        return "肥胖", "建议咨询医生或营养师，制定科学的减重计划，增加有氧运动，严格控制饮食。"
+def get_bmi_category(bmi: float, standard: str = None) -> Tuple[str, str]:
+    code = int(classify_bmi([bmi], standard)[0])
+    return _CATEGORY_TABLE[code], _ADVICE_TABLE[code]
+
+def get_bmi_thresholds(standard: str = None) -> Tuple[float, float, float]:
+    """分级标准的分界值，默认使用 DATA.BMI_STANDARD"""
+    standard = standard or DATA.BMI_STANDARD
+    if standard not in DATA.BMI_THRESHOLDS:
+        raise ValueError(f"未知的BMI标准: {standard}，可选: {', '.join(DATA.BMI_THRESHOLDS)}")
+    return DATA.BMI_THRESHOLDS[standard]
+
+def classify_bmi(bmi, standard: str = None) -> np.ndarray:
+    """把BMI数组一次分箱为int8类别编码（0偏瘦 1正常 2超重 3肥胖，缺失为-1）"""
+    bmi = np.asarray(bmi, dtype=float)
+    codes = np.digitize(bmi, get_bmi_thresholds(standard)).astype(np.int8)
+    codes[np.isnan(bmi)] = -1
+    return codes
+
+def bmi_category_labels(codes) -> pd.Categorical:
+    """类别编码转为分类类型（每行只存编码，缺失的编码为NaN）"""
+    return pd.Categorical.from_codes(np.asarray(codes), categories=BMI_CATEGORIES)
+
+def bmi_category_names(codes) -> np.ndarray:
+    """按类别编码查类别名称（编码-1为"未知"）"""
+    return _CATEGORY_TABLE[np.asarray(codes)]
+
+def bmi_advice(codes) -> np.ndarray:
+    """按类别编码查建议文本"""
+    return _ADVICE_TABLE[np.asarray(codes)]
 
 def calculate_bmr(weight_kg, height_cm, age, sex):
     """使用Mifflin-St Jeor公式计算基础代谢率（更准确）"""
@@ -29,5 +63,21 @@ def calculate_bmr(weight_kg, height_cm, age, sex):
     else:
         return 10 * weight_kg + 6.25 * height_cm - 5 * age - 161
 
+def calculate_bmi_array(weight, height_cm) -> np.ndarray:
+    """calculate_bmi 的数组版本：一次计算整列，身高<=0或缺失时为NaN，保留1位小数"""
+    weight = np.asarray(weight, dtype=float)
+    height_m = np.asarray(height_cm, dtype=float) / 100.0
+    with np.errstate(divide='ignore', invalid='ignore'):
+        bmi = weight / (height_m ** 2)
+    return np.round(np.where(height_m > 0, bmi, np.nan), 1)
+
+def calculate_bmr_array(weight_kg, height_cm, age, sex) -> np.ndarray:
+    """calculate_bmr 的数组版本，年龄和性别可以是单个值，也可以是逐行的数组"""
+    weight_kg = np.asarray(weight_kg, dtype=float)
+    height_cm = np.asarray(height_cm, dtype=float)
+    age = np.asarray(age, dtype=float)
+    sex_offset = np.where(np.asarray(sex, dtype=object) == "男", 5, -161)
+    return 10 * weight_kg + 6.25 * height_cm - 5 * age + sex_offset
+
 
 
@@ -2,6 +2,7 @@
 
 
 from typing import Dict
+import io
 import numpy as np
 import pandas as pd
 import matplotlib.pyplot as plt
@@ -10,6 +11,26 @@ import ui
 import models as md
 import datetime
 import DATA
+import fingerprint
+import training_jobs
+
+def show_cached_figure(name, key):
+    """图表输入没有变化时直接显示上次渲染的图片，返回是否命中"""
+    cached = st.session_state.get('figure_cache', {}).get(name)
+    if cached is not None and cached[0] == key:
+        st.image(cached[1])
+        return True
+    return False
+
+def show_figure(name, key, fig):
+    """显示图表，并按输入指纹缓存渲染好的PNG（每个图表只保留最新一份）"""
+    buf = io.BytesIO()
+    fig.savefig(buf, format='png', dpi=150, bbox_inches='tight')
+    plt.close(fig)
+    if 'figure_cache' not in st.session_state:
+        st.session_state.figure_cache = {}
+    st.session_state.figure_cache[name] = (key, buf.getvalue())
+    st.image(buf.getvalue())
 
 def set_weight_plot_limits(ax, historical_weights, predicted_weights=None):
     """统一设置体重图表的Y轴范围"""
@@ -35,14 +56,18 @@ def plot_weight_trend(df: pd.DataFrame, days: int = 90):
         ui.create_info_box("暂无数据", "info")
         return
 
-    end_date = df['date'].max()
-    start_date = end_date - pd.Timedelta(days=days)
-    sub = df[(df['date'] >= start_date) & (df['date'] <= end_date)].sort_values('date')
+    sub = md.load_recent(days, df)
 
     if len(sub) < 2:
         ui.create_info_box(f"最近 {days} 天数据不足，无法绘制趋势图。", "warning")
         return
 
+    cache_key = fingerprint.object_fingerprint({
+        'data': sub[['date', 'weight']], 'days': days, 'target': st.session_state.target_weight
+    })
+    if show_cached_figure('weight_trend', cache_key):
+        return
+
     fig, ax = plt.subplots(figsize=(12, 6))
 
     # 使用渐变色填充
@@ -72,21 +97,23 @@ def plot_weight_trend(df: pd.DataFrame, days: int = 90):
 
     fig.autofmt_xdate(rotation=45)
     plt.tight_layout()
-    st.pyplot(fig)
+    show_figure('weight_trend', cache_key, fig)
 
 def plot_calorie_balance(df: pd.DataFrame, days: int = 30):
     if 'df' in locals() and df.empty:
         st.info("暂无数据")
         return
 
-    end_date = df['date'].max()
-    start_date = end_date - pd.Timedelta(days=days)
-    sub = df[(df['date'] >= start_date) & (df['date'] <= end_date)].copy()
+    sub = md.load_recent(days, df).copy()
 
     if len(sub) < 2:
         st.info(f"最近 {days} 天数据不足，无法绘制图表。")
         return
 
+    cache_key = fingerprint.object_fingerprint({'data': sub, 'days': days})
+    if show_cached_figure('calorie_balance', cache_key):
+        return
+
     sub['calorie_burn'] = sub.apply(lambda r: DATA.EXERCISE_Kkcal.get(r['exercise_type'], 0) *
                                               (r['weight'] if not pd.isna(r['weight']) else 0) *
                                               (0 if pd.isna(r['exercise_time']) else r['exercise_time']) / 60 +
@@ -112,7 +139,18 @@ def plot_calorie_balance(df: pd.DataFrame, days: int = 30):
     ax.set_xticklabels(sub['date'].dt.strftime('%m-%d'), rotation=35)
     ax.grid(True, axis='y', linestyle='--', alpha=0.6)
     ax.legend()
-    st.pyplot(fig)
+    show_figure('calorie_balance', cache_key, fig)
+
+def draw_prediction_bands(ax, pred_dates, bands):
+    """画出蒙特卡洛预测的分位数区间（外层最宽的区间最浅），没有区间时不画"""
+    if not bands:
+        return
+    levels = sorted(int(key[1:]) for key in bands)
+    # 从外到内成对取分位数：(p5, p95)、(p25, p75)……
+    for i in range(len(levels) // 2):
+        low, high = levels[i], levels[-1 - i]
+        ax.fill_between(pred_dates, bands[f"p{low}"], bands[f"p{high}"], alpha=0.15 + 0.1 * i,
+                        color='#F18F01', linewidth=0, label=f'{high - low}%预测区间')
 
 def plot_history_with_prediction(df: pd.DataFrame, pred: Dict):
 
@@ -129,10 +167,6 @@ def plot_history_with_prediction(df: pd.DataFrame, pred: Dict):
     pred_dates = [p['date'] for p in pred['predictions']]
     pred_weights = [p['weight'] for p in pred['predictions']]
 
-    # 计算不确定性（基于历史波动性）
-    hist_std = hist['weight'].std() if len(hist) > 1 else 0.5
-    pred_stds = [hist_std * (1 + i * 0.1) for i in range(len(pred_dates))]  # 随时间增加不确定性
-
     fig, ax = plt.subplots(figsize=(14, 8))
 
     # 1. 历史数据
@@ -143,12 +177,8 @@ def plot_history_with_prediction(df: pd.DataFrame, pred: Dict):
     ax.plot(pred_dates, pred_weights, marker='s', linestyle='-', linewidth=2.5,
             markersize=5, color='#A23B72', label='LSTM预测体重', alpha=0.9)
 
-    # 3. 不确定性区间（95%置信区间）
-    upper_bound = [weight + 1.96 * std for weight, std in zip(pred_weights, pred_stds)]
-    lower_bound = [weight - 1.96 * std for weight, std in zip(pred_weights, pred_stds)]
-
-    ax.fill_between(pred_dates, lower_bound, upper_bound, alpha=0.2,
-                    color='#F18F01', label='95%置信区间')
+    # 3. 预测区间（蒙特卡洛预测的分位数）
+    draw_prediction_bands(ax, pred_dates, pred.get('bands'))
 
     # 4. 目标体重线
     if st.session_state.target_weight is not None:
@@ -188,7 +218,9 @@ def plot_history_with_prediction(df: pd.DataFrame, pred: Dict):
     ax.set_ylabel('体重 (kg)', fontsize=12, fontweight='bold')
 
     # 动态调整Y轴范围
-    all_weights = list(hist['weight']) + pred_weights + upper_bound + lower_bound
+    all_weights = list(hist['weight']) + pred_weights
+    for values in (pred.get('bands') or {}).values():
+        all_weights += list(values)
     if st.session_state.target_weight is not None:
         all_weights.append(st.session_state.target_weight)
 
@@ -244,20 +276,14 @@ def display_prediction_results(df, training_plan=None):
 
     # 检查模型是否存在
     if model is None:
-        # 尝试训练模型
-        with st.spinner("正在训练预测模型..."):
-            train_result = md.train_lstm(df)
-            # 检查训练结果
-            if train_result.get("status") == "error":
-                st.error(f"模型训练失败: {train_result.get('message')}")
-                return
-
-            # 重新加载模型
-            model, scalers = md.load_lstm()
-            if model is None:
-                st.error("模型训练后仍无法加载。")
-                st.info("这可能是因为数据量不足或数据格式问题。请继续记录更多数据。")
-                return
+        # 提交后台训练，训练完成后再次打开本页即可预测
+        job = training_jobs.queue.status(st.session_state.current_user)
+        if job is not None and job['status'] == training_jobs.ERROR:
+            st.error(f"模型训练失败: {job['message']}")
+        training_jobs.queue.submit(st.session_state.current_user, df, training_plan,
+                                   st.session_state.get('diet_plan'), md.session_profile())
+        st.info("预测模型正在后台训练，请稍后刷新查看预测结果。")
+        return
 
     # 执行预测
     with st.spinner("正在计算体重预测..."):
@@ -0,0 +1,143 @@
+#能量平衡预测：按每日热量收支推算体重，无需训练，可批量计算
+
+import numpy as np
+import pandas as pd
+import streamlit as st
+import DATA
+import Plan
+import bmi_calculation
+import feature_cache
+import forecast_cache
+import forecast_ensemble
+import models
+
+# 没有饮食计划时，用最近多少天记录的平均摄入作为每日摄入
+RECENT_INTAKE_DAYS = 14
+
+
+def activity_factor(activity_level=None):
+    """活动水平对应的TDEE系数，未知时按"轻度活动"计算"""
+    return DATA.ACTIVITY_LEVELS.get(activity_level, DATA.ACTIVITY_LEVELS[DATA.DEFAULT_ACTIVITY_LEVEL])
+
+
+def simulate(start_weight, height_cm, age, sex, activity, intake, exercise):
+    """
+    逐日能量平衡模拟，对所有用户同时计算。
+    start_weight/height_cm/age/sex/activity 形状为 (users,) 或标量，
+    intake/exercise 为每日摄入和运动消耗，形状 (users, days) 或 (days,)。
+    返回 (weights, bmr)，形状均为 (users, days)：第d天结束时的体重和当天的基础代谢
+    """
+    start_weight = np.atleast_1d(np.asarray(start_weight, dtype=float))
+    intake = np.asarray(intake, dtype=float)
+    exercise = np.asarray(exercise, dtype=float)
+    shape = np.broadcast_shapes(start_weight.shape + (1,), intake.shape, exercise.shape)
+    intake = np.broadcast_to(intake, shape)
+    exercise = np.broadcast_to(exercise, shape)
+    activity = np.asarray(activity, dtype=float)
+
+    # Mifflin-St Jeor 对体重是线性的：BMR = 10 × 体重 + 与体重无关的部分
+    bmr_base = bmi_calculation.calculate_bmr_array(0.0, height_cm, age, sex)
+
+    weights = np.empty(shape)
+    bmr = np.empty(shape)
+    weight = np.broadcast_to(start_weight, shape[:-1]).astype(float)
+    for day in range(shape[-1]):
+        bmr[..., day] = 10 * weight + bmr_base
+        balance = intake[..., day] - bmr[..., day] * activity - exercise[..., day]
+        weight = weight + balance / DATA.KCAL_PER_KG
+        weights[..., day] = weight
+    return weights, bmr
+
+
+def daily_intake(df, planned_calories):
+    """饮食计划的每日摄入；没有饮食计划时用最近记录的平均摄入"""
+    if np.any(planned_calories > 0):
+        return planned_calories
+    recent = df.sort_values('date').tail(RECENT_INTAKE_DAYS)
+    intake = recent['calorie_intake'] if 'calorie_intake' in recent.columns else pd.Series(dtype=float)
+    # 与训练特征一致：缺失的摄入按 体重×30 估算
+    intake = intake.fillna(recent['weight'] * 30).mean()
+    return np.full(len(planned_calories), intake if pd.notna(intake) else 0.0)
+
+
+def predict_future_energy(df: pd.DataFrame, days: int = 28, training_plan=None, diet_plan=None,
+                          profile: dict = None, activity_level: str = None, samples: int = 0, seed: int = None):
+    """
+    能量平衡预测，返回与 predict_future_lstm 相同结构的结果。
+    samples>0 时对计划执行情况采样，所有轨迹一起模拟，结果中附带分位数区间 bands；
+    与LSTM预测一样是确定性的，轨迹缓存在 forecast_cache 中
+    """
+    profile = profile or models.session_profile()
+    if activity_level is None:
+        activity_level = st.session_state.get('user_activity_level', DATA.DEFAULT_ACTIVITY_LEVEL)
+
+    if df is None or df.empty or df['weight'].dropna().empty:
+        return {"status": "error", "message": "没有体重数据，无法预测。"}
+
+    data = df.dropna(subset=['weight']).sort_values('date')
+    last = data.iloc[-1]
+    last_weight = float(last['weight'])
+    height = last['height'] if 'height' in data.columns and pd.notna(last['height']) else profile['user_height']
+
+    pred_dates = pd.date_range(last['date'] + pd.Timedelta(days=1), periods=days, freq='D')
+    planned = Plan.planned_features(pred_dates, training_plan, diet_plan)
+    planned_exercise = np.nan_to_num(planned[:, 0])
+    intake = daily_intake(data, planned[:, 1])
+
+    factor = activity_factor(activity_level)
+    key = forecast_cache.forecast_key(
+        inputs=feature_cache.feature_key(df, training_plan, diet_plan, profile),
+        method="energy_balance", activity=factor, samples=samples, seed=seed)
+    seed = forecast_ensemble.forecast_seed(key) if seed is None else seed
+
+    def rollout(start, last_weights, end):
+        # 计算第start天到第end天的轨迹，每天的输入与之前算过的天一致
+        dates = pd.date_range(last['date'] + pd.Timedelta(days=1), periods=end, freq='D')
+        plan = Plan.planned_features(dates, training_plan, diet_plan)
+        exercise, daily = np.nan_to_num(plan[:, 0]), daily_intake(data, plan[:, 1])
+        if samples > 0:
+            exercise, daily = forecast_ensemble.sample_adherence(exercise, daily, forecast_ensemble.draw_daily(
+                seed, end, samples))
+        trajectories, _ = simulate(last_weight if last_weights is None else last_weights, height,
+                                   profile['user_age'], profile['user_sex'], factor,
+                                   daily[..., start:], exercise[..., start:])
+        return trajectories
+
+    trajectories = forecast_cache.cache.get(key, days, rollout)
+    bands = None
+    if samples > 0:
+        # 与LSTM的蒙特卡洛预测一致：体重取所有轨迹的中位数
+        bands = forecast_ensemble.quantile_bands(trajectories)
+        weights = np.median(trajectories, axis=0)
+    else:
+        weights = trajectories[0]
+    # 第d天的基础代谢按当天开始时的体重计算
+    start_weights = np.concatenate([[last_weight], weights[:-1]])
+    bmr = bmi_calculation.calculate_bmr_array(start_weights, height, profile['user_age'], profile['user_sex'])
+    bmis = bmi_calculation.calculate_bmi_array(weights, height)
+    total_burn = bmr * factor + planned_exercise
+
+    preds = [{
+        "date": pred_dates[i],
+        "weight": round(float(weights[i]), 2),
+        "bmi": round(float(bmis[i]), 2),
+        "planned_exercise": round(float(planned_exercise[i]), 1),
+        "planned_calories": round(float(intake[i]), 1),
+        "total_calorie_burn": round(float(total_burn[i]), 1),
+        "basal_metabolism": round(float(bmr[i]), 1)
+    } for i in range(days)]
+
+    result = {
+        "status": "success",
+        "method": "energy_balance",
+        "predictions": preds,
+        "start_date": preds[0]['date'] if preds else None,
+        "end_date": preds[-1]['date'] if preds else None,
+        "start_weight": round(last_weight, 1),
+        "end_weight": preds[-1]['weight'] if preds else None,
+        "weight_change": round(preds[-1]['weight'] - last_weight, 1) if preds else None,
+    }
+    if bands is not None:
+        result["samples"] = samples
+        result["bands"] = bands
+    return result
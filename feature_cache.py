@@ -0,0 +1,65 @@
+#特征缓存：同一份数据/计划/用户资料的特征表只构建一次
+
+import threading
+from collections import OrderedDict
+import DATA
+import fingerprint
+
+
+def feature_key(df, training_plan=None, diet_plan=None, profile=None):
+    """特征表的缓存键：数据、训练计划、饮食计划和用户资料的内容指纹"""
+    return fingerprint.object_fingerprint({
+        'df': df,
+        'training_plan': training_plan,
+        'diet_plan': diet_plan,
+        'profile': profile,
+    })
+
+
+class FeatureCache:
+    """
+    按内容指纹缓存构建好的特征表，超出条目数时淘汰最久未使用的。
+    训练、构建序列和预测使用同一份数据时共享同一个特征表
+    """
+
+    def __init__(self, max_entries=None):
+        self.max_entries = DATA.FEATURE_CACHE_SIZE if max_entries is None else max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key, builder):
+        """返回key对应的特征表，未命中时调用builder()构建并缓存"""
+        with self._lock:
+            frame = self._entries.get(key)
+            if frame is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return frame
+
+        frame = builder()
+        with self._lock:
+            self.misses += 1
+            self._entries[key] = frame
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return frame
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            return {
+                'entries': len(self._entries),
+                'max_entries': self.max_entries,
+                'hits': self.hits,
+                'misses': self.misses,
+            }
+
+
+# 进程级共享的特征缓存
+cache = FeatureCache()
@@ -0,0 +1,43 @@
+#数据指纹（用于判断会话数据是否发生变化）
+
+import hashlib
+import pickle
+import numpy as np
+import pandas as pd
+
+
+def row_hashes(df) -> np.ndarray:
+    """逐行内容哈希（向量化，比逐行序列化快得多）"""
+    if df is None or len(df) == 0:
+        return np.empty(0, dtype=np.uint64)
+    return pd.util.hash_pandas_object(df, index=False).values
+
+
+def frame_fingerprint(df, hashes=None) -> str:
+    """计算DataFrame内容指纹（列名、类型和所有单元格）"""
+    if df is None:
+        return "none"
+    if hashes is None:
+        hashes = row_hashes(df)
+    h = hashlib.blake2b(digest_size=16)
+    h.update(repr(list(df.columns)).encode())
+    h.update(repr([str(t) for t in df.dtypes]).encode())
+    h.update(hashes.tobytes())
+    return h.hexdigest()
+
+
+def object_fingerprint(obj) -> str:
+    """计算任意会话对象的指纹，DataFrame走向量化哈希"""
+    if isinstance(obj, pd.DataFrame):
+        return frame_fingerprint(obj)
+    if isinstance(obj, dict):
+        h = hashlib.blake2b(digest_size=16)
+        for key in sorted(obj, key=str):
+            h.update(repr(key).encode())
+            h.update(object_fingerprint(obj[key]).encode())
+        return h.hexdigest()
+    try:
+        payload = pickle.dumps(obj, protocol=pickle.HIGHEST_PROTOCOL)
+    except Exception:
+        payload = repr(obj).encode()
+    return hashlib.blake2b(payload, digest_size=16).hexdigest()
@@ -0,0 +1,79 @@
+#预测结果缓存：同样输入的预测只算一次，天数变短时截取，变长时从缓存的最后一天接着算
+
+import threading
+from collections import OrderedDict
+import numpy as np
+import DATA
+import fingerprint
+
+
+def forecast_key(**parts):
+    """预测的缓存键：数据/计划/用户资料指纹、模型版本、预测方法、样本数等的内容指纹"""
+    return fingerprint.object_fingerprint(parts)
+
+
+class ForecastCache:
+    """
+    按输入指纹缓存每条轨迹的逐日体重 (trajectories, days)，只保留算过的最长天数，
+    超出条目数时淘汰最久未使用的。预测是确定性的（见 forecast_ensemble.draw_daily），
+    所以截取和续算的结果与直接算相同天数一致
+    """
+
+    def __init__(self, max_entries=None):
+        self.max_entries = DATA.FORECAST_CACHE_SIZE if max_entries is None else max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.resumes = 0
+        self.misses = 0
+
+    def get(self, key, days, rollout):
+        """
+        返回key对应的前days天轨迹。缓存不够长时调用 rollout(start, last_weights, days)
+        计算第start天到第days天（不含）的轨迹，last_weights 为缓存最后一天的体重（没有缓存时为None）
+        """
+        with self._lock:
+            weights = self._entries.get(key)
+            if weights is not None:
+                self._entries.move_to_end(key)
+                if weights.shape[1] >= days:
+                    self.hits += 1
+                    return weights[:, :days]
+
+        if weights is None:
+            weights = rollout(0, None, days)
+        else:
+            weights = np.concatenate([weights, rollout(weights.shape[1], weights[:, -1], days)], axis=1)
+        # 缓存的数组被多个调用方共享，禁止原地修改
+        weights.setflags(write=False)
+
+        with self._lock:
+            current = self._entries.get(key)
+            if current is None:
+                self.misses += 1
+            else:
+                self.resumes += 1
+            if current is None or current.shape[1] < weights.shape[1]:
+                self._entries[key] = weights
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return weights
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            return {
+                'entries': len(self._entries),
+                'max_entries': self.max_entries,
+                'hits': self.hits,
+                'resumes': self.resumes,
+                'misses': self.misses,
+            }
+
+
+# 进程级共享的预测缓存
+cache = ForecastCache()
@@ -0,0 +1,58 @@
+#蒙特卡洛预测集合：对计划执行情况随机采样，得到体重预测的分位数区间
+
+import numpy as np
+import DATA
+import fingerprint
+
+
+def forecast_seed(key) -> int:
+    """由预测输入的指纹得到随机种子：输入相同，预测结果也相同"""
+    return int(fingerprint.object_fingerprint(key)[:16], 16)
+
+
+def day_rng(seed, day):
+    """第day个预测日专用的随机数生成器"""
+    return np.random.default_rng((seed, day))
+
+
+def draw_daily(seed, days, samples):
+    """
+    前days个预测日的随机量，每天由 day_rng(seed, day) 单独生成，
+    所以某一天的随机量与一共预测多少天无关，预测天数加长时前面的结果不变。
+    返回的数组形状均为 (max(samples, 1), days)：
+    exercise_done/exercise_intensity/calorie_noise 用于计划执行的采样，fluctuation 为[-1, 1]内的每日波动
+    """
+    n = max(samples, 1)
+    draws = {name: np.empty((n, days)) for name in
+             ('exercise_done', 'exercise_intensity', 'calorie_noise', 'fluctuation')}
+    for day in range(days):
+        rng = day_rng(seed, day)
+        draws['fluctuation'][:, day] = rng.uniform(-1.0, 1.0, n)
+        if samples > 0:
+            draws['exercise_done'][:, day] = rng.random(n)
+            draws['exercise_intensity'][:, day] = rng.standard_normal(n)
+            draws['calorie_noise'][:, day] = rng.standard_normal(n)
+    return draws
+
+
+def sample_adherence(planned_exercise, planned_calories, draws):
+    """
+    按计划执行的随机偏差得到每条轨迹的每日运动消耗和热量摄入，形状均为 (samples, days)，draws 来自 draw_daily。
+    运动：每天以一定概率完成，完成时强度有波动；摄入：围绕计划值正态波动
+    """
+    planned_exercise = np.asarray(planned_exercise, dtype=float)
+    planned_calories = np.asarray(planned_calories, dtype=float)
+    days = planned_exercise.shape[-1]
+
+    done = draws['exercise_done'][:, :days] < DATA.ADHERENCE_EXERCISE_PROB
+    intensity = 1.0 + DATA.ADHERENCE_EXERCISE_CV * draws['exercise_intensity'][:, :days]
+    exercise = planned_exercise * done * np.clip(intensity, 0, None)
+    calories = planned_calories * np.clip(1.0 + DATA.ADHERENCE_CALORIE_CV * draws['calorie_noise'][:, :days], 0, None)
+    return exercise, calories
+
+
+def quantile_bands(weights):
+    """每个预测日在所有样本上的分位数，weights 形状 (samples, days)，返回 {'p5': [...], ...}"""
+    levels = DATA.ENSEMBLE_PERCENTILES
+    values = np.percentile(weights, levels, axis=0)
+    return {f"p{level}": np.round(row, 2).tolist() for level, row in zip(levels, values)}
@@ -0,0 +1,166 @@
+#预测结果存储：为每个用户预先算好最长天数的预测，预测页按所选天数截取，打开页面只需读文件
+
+import argparse
+import os
+import pickle
+import sys
+import time
+import DATA
+import fingerprint
+import models
+import storage
+import energy_balance
+from user_manager import read_user_inputs
+
+METHODS = ("lstm", "energy_balance")
+
+
+def _plan_fingerprint(plan):
+    # 没有计划（None）和空计划等价，会话和离线任务读到的可能是其中任一种
+    if plan is None or plan.empty:
+        return None
+    return fingerprint.object_fingerprint(plan)
+
+
+def forecast_key(username, df, training_plan, diet_plan, profile, activity_level, method, samples):
+    """预测输入（数据、计划、个人信息、模型文件、预测方法、样本数）的指纹，任一项变化预存结果即失效"""
+    model_path = DATA.get_model_file(username)
+    model_mtime = os.path.getmtime(model_path) if method == "lstm" and os.path.exists(model_path) else None
+    return fingerprint.object_fingerprint({
+        'df': df,
+        'training_plan': _plan_fingerprint(training_plan),
+        'diet_plan': _plan_fingerprint(diet_plan),
+        'profile': (profile['user_height'], profile['user_age'], profile['user_sex'], activity_level),
+        'model': model_mtime,
+        'method': method,
+        'samples': samples,
+    })
+
+
+def read_store(username):
+    """用户的全部预存预测 {(method, samples): entry}，文件不存在或损坏时为空"""
+    path = DATA.get_forecast_file(username)
+    if not os.path.exists(path):
+        return {}
+    try:
+        with open(path, "rb") as f:
+            return pickle.load(f)
+    except Exception:
+        return {}
+
+
+def save_forecast(username, key, method, samples, pred):
+    """保存一份未截取的预测并返回该记录，先写临时文件再替换，页面不会读到写了一半的文件"""
+    store = read_store(username)
+    entry = store[(method, samples)] = {
+        'key': key,
+        'created_at': time.time(),
+        # LSTM单条轨迹存的是未平滑的结果，截取后再平滑，避免截断处用到之后的天
+        'smooth': method == "lstm" and not samples,
+        'pred': pred,
+    }
+    path = DATA.get_forecast_file(username)
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "wb") as f:
+        pickle.dump(store, f)
+    os.replace(tmp_path, path)
+    return entry
+
+
+def slice_forecast(entry, days):
+    """把预存的预测截取为前 days 天，返回与 predict_future_lstm 相同结构的结果"""
+    pred = entry['pred']
+    preds = pred['predictions'][:days]
+    if entry.get('smooth'):
+        preds = models.smooth_predictions(preds)
+    result = dict(pred)
+    result.update({
+        "predictions": preds,
+        "start_date": preds[0]['date'] if preds else None,
+        "end_date": preds[-1]['date'] if preds else None,
+        "end_weight": preds[-1]['weight'] if preds else None,
+        "weight_change": round(preds[-1]['weight'] - pred['start_weight'], 1) if preds else None,
+    })
+    if pred.get('bands') is not None:
+        result['bands'] = {name: values[:days] for name, values in pred['bands'].items()}
+    return result
+
+
+def load_forecast(username, key, method, samples, days):
+    """预存的预测仍然有效且够长时返回截取后的结果，否则返回None"""
+    entry = read_store(username).get((method, samples))
+    if entry is None or entry['key'] != key or len(entry['pred']['predictions']) < days:
+        return None
+    return slice_forecast(entry, days)
+
+
+def compute_forecast(username, df, training_plan, diet_plan, profile, activity_level, method, samples,
+                     model=None, scalers=None):
+    """计算 DATA.FORECAST_HORIZON_DAYS 天的未截取预测（LSTM没有模型时返回错误，不会触发训练）"""
+    if method == "lstm":
+        if model is None or scalers is None:
+            model, scalers = models.load_lstm(username)
+        if model is None or scalers is None:
+            return {"status": "error", "message": "模型未找到"}
+        return models.predict_future_lstm(df, model, scalers, DATA.FORECAST_HORIZON_DAYS, training_plan, diet_plan,
+                                          profile=profile, samples=samples, smooth=False)
+    return energy_balance.predict_future_energy(df, DATA.FORECAST_HORIZON_DAYS, training_plan, diet_plan,
+                                                profile, activity_level, samples)
+
+
+def precompute_user(username, methods=METHODS, samples_options=None):
+    """为一个用户预算所有方法的预测，已是最新的跳过，返回 {(method, samples): 结果说明}"""
+    samples_options = samples_options or (DATA.ENSEMBLE_SAMPLES,)
+    df, training_plan, diet_plan, config = read_user_inputs(username)
+    if df is None or df['weight'].dropna().empty:
+        return {}
+    profile = models.profile_from_config(config)
+    activity_level = config.get('user_activity_level', DATA.DEFAULT_ACTIVITY_LEVEL)
+
+    status = {}
+    store = read_store(username)
+    for method in methods:
+        for samples in samples_options:
+            key = forecast_key(username, df, training_plan, diet_plan, profile, activity_level, method, samples)
+            entry = store.get((method, samples))
+            if entry is not None and entry['key'] == key:
+                status[(method, samples)] = "已是最新"
+                continue
+            pred = compute_forecast(username, df, training_plan, diet_plan, profile, activity_level,
+                                    method, samples)
+            if pred.get('status') != 'success':
+                status[(method, samples)] = pred.get('message', "预测失败")
+                continue
+            save_forecast(username, key, method, samples, pred)
+            status[(method, samples)] = "已更新"
+    return status
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=f"为用户预算{DATA.FORECAST_HORIZON_DAYS}天的体重预测")
+    parser.add_argument("--users", nargs="*", help="只处理指定用户（默认全部）")
+    parser.add_argument("--methods", nargs="*", choices=METHODS, default=list(METHODS), help="预测方法")
+    parser.add_argument("--samples", nargs="*", type=int, default=[DATA.ENSEMBLE_SAMPLES],
+                        help=f"蒙特卡洛样本数，0为单条轨迹（默认 {DATA.ENSEMBLE_SAMPLES}）")
+    args = parser.parse_args(argv)
+
+    started = time.perf_counter()
+    updated = 0
+    failed = 0
+    for username in args.users or storage.list_users():
+        try:
+            status = precompute_user(username, args.methods, args.samples)
+        except Exception as e:
+            # 单个用户出错不影响其他用户
+            failed += 1
+            print(f"{username}: 失败 {type(e).__name__}: {e}")
+            continue
+        for (method, samples), message in status.items():
+            updated += message == "已更新"
+            print(f"{username} {method} samples={samples}: {message}")
+    print(f"已更新 {updated} 份预测，失败 {failed} 个用户，耗时 {time.perf_counter() - started:.1f}s")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
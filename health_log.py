@@ -0,0 +1,105 @@
+#健康数据存储：有序快照 + 追加日志
+
+import os
+import pandas as pd
+
+HEALTH_COLUMNS = ['date', 'weight', 'height', 'exercise_type', 'exercise_time', 'calorie_intake']
+
+# 日志超过该大小（字节）时合并进快照
+COMPACT_LOG_BYTES = 64 * 1024
+
+
+def get_log_file(path):
+    """快照文件对应的追加日志路径"""
+    return path + ".log"
+
+
+def empty_frame():
+    return pd.DataFrame(columns=HEALTH_COLUMNS)
+
+
+def _read_csv(path):
+    if not os.path.exists(path) or os.path.getsize(path) == 0:
+        return None
+    try:
+        return pd.read_csv(path)
+    except pd.errors.EmptyDataError:
+        return None
+
+
+def read_records(path):
+    """读取快照并重放日志，同一日期以最后写入的记录为准"""
+    snapshot = _read_csv(path)
+    log = _read_csv(get_log_file(path))
+
+    if log is None or log.empty:
+        return snapshot if snapshot is not None else empty_frame()
+
+    frames = [f for f in (snapshot, log) if f is not None and not f.empty]
+    df = pd.concat(frames, ignore_index=True) if len(frames) > 1 else frames[0].copy()
+    if 'date' in df.columns:
+        df['date'] = pd.to_datetime(df['date'], errors='coerce', format='mixed')
+        # 稳定排序保证日志中的新记录排在同日期快照记录之后
+        df = df.sort_values('date', kind='mergesort').drop_duplicates('date', keep='last')
+    return df.reset_index(drop=True)
+
+
+def write_snapshot(df, path):
+    """整体写入有序快照并清空日志"""
+    tmp_path = path + ".tmp"
+    df.to_csv(tmp_path, index=False)
+    os.replace(tmp_path, path)
+    log_path = get_log_file(path)
+    if os.path.exists(log_path):
+        os.remove(log_path)
+
+
+def append_records(records, path):
+    """把新记录追加到日志末尾，日志过大时自动合并"""
+    if records is None or len(records) == 0:
+        return
+    records = records.reindex(columns=HEALTH_COLUMNS)
+    log_path = get_log_file(path)
+    write_header = not os.path.exists(log_path) or os.path.getsize(log_path) == 0
+    records.to_csv(log_path, mode='a', header=write_header, index=False)
+
+    if os.path.getsize(log_path) > COMPACT_LOG_BYTES:
+        compact(path)
+
+
+def compact(path):
+    """把日志合并进快照"""
+    if not os.path.exists(get_log_file(path)):
+        return
+    write_snapshot(read_records(path), path)
+
+
+def upsert_suffix(old_hashes, old_dates, new_df, new_hashes):
+    """
+    判断new_df能否通过向日志追加若干行得到（按日期覆盖的语义）。
+    可以则返回需要追加的行，否则返回None（需要整体重写）
+    """
+    if old_hashes is None or 'date' not in new_df.columns or len(new_df) == 0:
+        return None
+    # 日志只记录标准列，带额外列的数据只能整体重写
+    if set(new_df.columns) - set(HEALTH_COLUMNS):
+        return None
+    dates = new_df['date']
+    if not dates.is_monotonic_increasing or dates.duplicated().any():
+        return None
+
+    # 找到第一处不同的行
+    n = min(len(old_hashes), len(new_hashes))
+    diff = (old_hashes[:n] != new_hashes[:n]).nonzero()[0]
+    start = int(diff[0]) if len(diff) else n
+    suffix = new_df.iloc[start:]
+    if suffix.empty:
+        return None
+
+    # 被替换掉的旧记录必须都能被同日期的新记录覆盖
+    if not pd.Index(old_dates[start:]).isin(pd.Index(suffix['date'])).all():
+        return None
+    # 追加量过大时不如直接重写快照
+    if len(suffix) > max(32, len(new_df) // 4):
+        return None
+    return suffix
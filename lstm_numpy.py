@@ -0,0 +1,168 @@
+#纯NumPy的LSTM推理（服务端无需加载TensorFlow）
+
+import argparse
+import os
+import numpy as np
+import DATA
+
+ACTIVATIONS = {
+    'relu': lambda x: np.maximum(x, 0.0),
+    'tanh': np.tanh,
+    # 1/(1+e^-x) 的数值稳定写法，x很小时 exp(-x) 不会溢出
+    'sigmoid': lambda x: np.exp(-np.logaddexp(0.0, -x)),
+    'hard_sigmoid': lambda x: np.clip(0.2 * x + 0.5, 0.0, 1.0),
+    'linear': lambda x: x,
+}
+
+
+def _activation_name(activation):
+    name = activation if isinstance(activation, str) else getattr(activation, '__name__', str(activation))
+    if name not in ACTIVATIONS:
+        raise ValueError(f"不支持的激活函数: {name}")
+    return name
+
+
+class NumpyMinMaxScaler:
+    """与 sklearn MinMaxScaler 等价的线性变换：X * scale_ + min_"""
+
+    def __init__(self, scale, min_):
+        self.scale_ = np.asarray(scale, dtype=float)
+        self.min_ = np.asarray(min_, dtype=float)
+
+    def transform(self, x):
+        return np.asarray(x, dtype=float) * self.scale_ + self.min_
+
+    def inverse_transform(self, x):
+        return (np.asarray(x, dtype=float) - self.min_) / self.scale_
+
+
+class NumpyLSTM:
+    """单层LSTM + Dense(1) 的前向计算，接口与Keras模型的预测方法一致"""
+
+    # 大batch分块计算，中间结果留在CPU缓存内（蒙特卡洛预测时batch可达数万个窗口）
+    batch_size = 1024
+
+    def __init__(self, kernel, recurrent_kernel, bias, dense_kernel, dense_bias,
+                 activation='tanh', recurrent_activation='sigmoid'):
+        self.kernel = np.asarray(kernel, dtype=np.float32)
+        self.recurrent_kernel = np.asarray(recurrent_kernel, dtype=np.float32)
+        self.bias = np.asarray(bias, dtype=np.float32)
+        self.dense_kernel = np.asarray(dense_kernel, dtype=np.float32)
+        self.dense_bias = np.asarray(dense_bias, dtype=np.float32)
+        self.activation = _activation_name(activation)
+        self.recurrent_activation = _activation_name(recurrent_activation)
+        self.units = self.recurrent_kernel.shape[0]
+
+    def get_weights(self):
+        return [self.kernel, self.recurrent_kernel, self.bias, self.dense_kernel, self.dense_bias]
+
+    def predict_on_batch(self, x):
+        """x: (batch, seq_len, n_features) -> (batch, 1)"""
+        x = np.asarray(x, dtype=np.float32)
+        if x.shape[0] > self.batch_size:
+            return np.concatenate([self._forward(x[start:start + self.batch_size])
+                                   for start in range(0, x.shape[0], self.batch_size)])
+        return self._forward(x)
+
+    def _forward(self, x):
+        act = ACTIVATIONS[self.activation]
+        rec_act = ACTIVATIONS[self.recurrent_activation]
+        units = self.units
+        h = np.zeros((x.shape[0], units), dtype=np.float32)
+        c = np.zeros((x.shape[0], units), dtype=np.float32)
+
+        # 输入部分对所有时间步一次算完，循环中只剩隐藏状态相关的计算
+        x_proj = x @ self.kernel + self.bias
+        for t in range(x.shape[1]):
+            # Keras门顺序：输入门、遗忘门、候选状态、输出门
+            z = x_proj[:, t] + h @ self.recurrent_kernel
+            i = rec_act(z[:, :units])
+            f = rec_act(z[:, units:2 * units])
+            c = f * c + i * act(z[:, 2 * units:3 * units])
+            o = rec_act(z[:, 3 * units:])
+            h = o * act(c)
+        return h @ self.dense_kernel + self.dense_bias
+
+    def predict(self, x, verbose=0, **kwargs):
+        return self.predict_on_batch(x)
+
+
+def export_model(model, scalers, path):
+    """把Keras模型（LSTM + Dense）和Scaler参数导出为一个紧凑的.npz文件"""
+    lstm = dense = None
+    for layer in model.layers:
+        kind = type(layer).__name__
+        if kind == 'LSTM' and lstm is None:
+            lstm = layer
+        elif kind == 'Dense':
+            dense = layer
+    if lstm is None or dense is None or len(model.layers) != 2:
+        raise ValueError("只支持单层LSTM + Dense结构的模型")
+
+    config = lstm.get_config()
+    kernel, recurrent_kernel, bias = lstm.get_weights()
+    dense_kernel, dense_bias = dense.get_weights()
+    scaler_x, scaler_y = scalers
+
+    tmp_path = path + ".tmp.npz"
+    np.savez(
+        tmp_path,
+        kernel=kernel, recurrent_kernel=recurrent_kernel, bias=bias,
+        dense_kernel=dense_kernel, dense_bias=dense_bias,
+        activation=np.array(_activation_name(config.get('activation', 'tanh'))),
+        recurrent_activation=np.array(_activation_name(config.get('recurrent_activation', 'sigmoid'))),
+        x_scale=scaler_x.scale_, x_min=scaler_x.min_,
+        y_scale=scaler_y.scale_, y_min=scaler_y.min_,
+    )
+    os.replace(tmp_path, path)
+
+
+def load_model_file(path):
+    """加载导出的.npz，返回 (model, (scaler_x, scaler_y))"""
+    with np.load(path) as f:
+        model = NumpyLSTM(
+            f['kernel'], f['recurrent_kernel'], f['bias'], f['dense_kernel'], f['dense_bias'],
+            activation=str(f['activation']), recurrent_activation=str(f['recurrent_activation']),
+        )
+        scalers = (NumpyMinMaxScaler(f['x_scale'], f['x_min']),
+                   NumpyMinMaxScaler(f['y_scale'], f['y_min']))
+    return model, scalers
+
+
+def is_export_fresh(username):
+    """导出文件存在且不早于Keras模型文件"""
+    npz_path = DATA.get_numpy_model_file(username)
+    model_path = DATA.get_model_file(username)
+    if not os.path.exists(npz_path) or os.path.getsize(npz_path) == 0:
+        return False
+    if os.path.exists(model_path):
+        return os.path.getmtime(npz_path) >= os.path.getmtime(model_path)
+    return True
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="导出已训练模型的NumPy推理文件")
+    parser.add_argument("--users", nargs="*", help="只导出指定用户（默认全部）")
+    args = parser.parse_args(argv)
+
+    import pickle
+    import ml_backend
+    import storage
+
+    load_model = ml_backend.keras().models.load_model
+
+    count = 0
+    for username in args.users or storage.list_users():
+        model_path = DATA.get_model_file(username)
+        scaler_path = DATA.get_scaler_file(username)
+        if not (os.path.exists(model_path) and os.path.exists(scaler_path)):
+            continue
+        with open(scaler_path, "rb") as f:
+            scalers = pickle.load(f)
+        export_model(load_model(model_path, compile=False), scalers, DATA.get_numpy_model_file(username))
+        count += 1
+    print(f"已导出 {count} 个用户的模型")
+
+
+if __name__ == "__main__":
+    main()
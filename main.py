@@ -10,6 +10,11 @@ import bmi_calculation
 import recommendation
 import draw_picture
 import DATA
+import fingerprint
+import training_jobs
+import energy_balance
+import scenarios
+import forecast_store
 from models import train_lstm
 
 def display_health_overview(df):
@@ -20,7 +25,7 @@ def display_health_overview(df):
 
     # 使用设置的身高计算BMI
     df['height'] = df['height'].fillna(st.session_state.user_height)
-    df['bmi'] = df.apply(lambda r: bmi_calculation.calculate_bmi(r['weight'], r['height']), axis=1)
+    df['bmi'] = bmi_calculation.calculate_bmi_array(df['weight'], df['height'])
     latest = df.sort_values('date').iloc[-1]
     bmi_val = float(latest['bmi'])
     cat, advice = bmi_calculation.get_bmi_category(bmi_val)
@@ -40,6 +45,46 @@ def display_health_overview(df):
     ui.create_info_box(advice, "info")
 
 
+@st.cache_data(max_entries=16, show_spinner=False)
+def overview_stats(df, user_height):
+    """概览页的统计数据，只在数据或身高变化时重新计算"""
+    data = df.copy()
+    data['height'] = data['height'].fillna(user_height)
+    data['bmi'] = bmi_calculation.calculate_bmi_array(data['weight'], data['height'])
+    data = data.sort_values('date')
+    latest = data.iloc[-1]
+    codes = bmi_calculation.classify_bmi(data['bmi'])
+    return {
+        'latest': latest,
+        'bmi': float(latest['bmi']),
+        'category': bmi_calculation.bmi_category_names(codes[-1]),
+        'advice': bmi_calculation.bmi_advice(codes[-1]),
+        'first_weight': float(data.iloc[0]['weight']),
+    }
+
+
+# 预测页可选的预测方法
+FORECAST_METHODS = {
+    "LSTM模型": "lstm",
+    "能量平衡": "energy_balance",
+}
+# LSTM预测至少需要的记录数，不足时改用能量平衡模型
+LSTM_MIN_RECORDS = 10
+
+
+def forecast_inputs_key(method="lstm", samples=0):
+    """当前会话的预测输入（数据、计划、个人信息、模型文件、预测方法、蒙特卡洛样本数）的指纹"""
+    return forecast_store.forecast_key(st.session_state.current_user, st.session_state.df,
+                                       st.session_state.user_training_plan, st.session_state.diet_plan,
+                                       models.session_profile(), st.session_state.user_activity_level,
+                                       method, samples)
+
+
+def prediction_inputs_key(days, method="lstm", samples=0):
+    """预测输入的指纹加上预测天数"""
+    return forecast_inputs_key(method, samples), days
+
+
 
 
 # 解决中文显示
@@ -91,7 +136,7 @@ if st.session_state.current_user is None:
             age = st.number_input("年龄", min_value=10, max_value=100, value=30)
 
         sex = st.radio("性别", ["男", "女"])
-        activity_level = st.selectbox("活动水平", ["久坐", "轻度活动", "中度活动", "高强度活动", "非常活跃"])
+        activity_level = st.selectbox("活动水平", list(DATA.ACTIVITY_LEVELS))
 
         if st.button("注册", key="register_btn"):
             if new_username.strip():
@@ -183,17 +228,16 @@ with tabs[0]:
     overview_df = st.session_state.df.copy()
     models.check_abnormal(overview_df)
     if st.button("📄 生成30天健康报告"):
-        last30 = overview_df.tail(30)
+        last30 = models.load_tail(30, overview_df)
         recommendation.export_report(last30)
     if overview_df.empty:
         st.info("尚无数据，请在'添加记录'页录入或导入数据。")
     else:
-        # 使用设置的身高计算BMI
-        overview_df['height'] = overview_df['height'].fillna(st.session_state.user_height)
-        overview_df['bmi'] = overview_df.apply(lambda r: bmi_calculation.calculate_bmi(r['weight'], r['height']), axis=1)
-        latest = overview_df.sort_values('date').iloc[-1]
-        bmi_val = float(latest['bmi'])
-        cat, advice = bmi_calculation.get_bmi_category(bmi_val)
+        # 使用设置的身高计算BMI（结果按数据缓存）
+        stats = overview_stats(overview_df, st.session_state.user_height)
+        latest = stats['latest']
+        bmi_val = stats['bmi']
+        cat, advice = stats['category'], stats['advice']
         c1, c2, c3, c4 = st.columns(4)
         c1.metric("最新日期", latest['date'].strftime('%Y-%m-%d'))
         c2.metric("体重(kg)", f"{latest['weight']}")
@@ -221,7 +265,7 @@ with tabs[0]:
         # 基线体重：优先用设定目标时记录的基线；如果还没保存过目标，就用最早一条记录兜底
         baseline_w = st.session_state.target_baseline_weight
         if baseline_w is None and not overview_df.empty:
-            baseline_w = float(overview_df.sort_values('date').iloc[0]['weight'])
+            baseline_w = stats['first_weight']
 
         if target_weight is not None:
             weight_diff = current_weight - target_weight  # >0 代表需要减重；<0 代表需要增重
@@ -302,7 +346,9 @@ with tabs[0]:
                 st.metric("热量平衡", f"{balance:+.0f} kcal")
 
 # ============ 添加记录 =============
-with tabs[1]:
+@st.fragment
+def render_add_record_tab():
+    """添加记录页：页内输入只重新运行本页，不会触发其它页的计算"""
     st.subheader("📝 添加体重记录")
     col_date, col_weight = st.columns(2)
     with col_date:
@@ -310,10 +356,6 @@ with tabs[1]:
     with col_weight:
         weight = st.number_input("体重(kg)", min_value=0.0, max_value=200.0, value=70.0, step=0.1,
                                  key="weight_input")
-    # 在每个tab的末尾添加自动保存
-    for tab in tabs:
-        # 在tab内容结束后添加
-        user_manager.save_user_data()
     # ================= 食物记录 =================
     st.subheader("🍽️ 今日饮食记录")
 
@@ -513,7 +555,8 @@ with tabs[1]:
             'calorie_intake': float(calorie_intake)
         }])
 
-        # 更新健康数据
+        # 更新健康数据：session_state.df 总是整体替换，不原地修改（保存时按对象判断是否变化，
+        # 原地修改需调用 user_manager.mark_dirty('df')）
         new_df = pd.concat([st.session_state.df, new_row], ignore_index=True)
         new_df = new_df.sort_values('date').drop_duplicates('date', keep='last')
         st.session_state.df = models.ensure_schema(new_df)
@@ -551,7 +594,14 @@ with tabs[1]:
 
     with col_import:
         uploaded_file = st.file_uploader("上传健康数据CSV文件", type="csv")
-        if uploaded_file is not None:
+        # 上传控件在重新运行后仍保留文件，同一个文件只导入一次
+        already_imported = uploaded_file is not None and \
+            st.session_state.get('imported_file_id') == uploaded_file.file_id
+        if already_imported:
+            st.success("成功导入数据！")
+            with st.expander("查看导入的数据"):
+                st.dataframe(st.session_state.get('import_preview'))
+        elif uploaded_file is not None:
             try:
                 # 首先检查文件是否为空
                 if uploaded_file.size == 0:
@@ -580,13 +630,13 @@ with tabs[1]:
                         st.session_state.df = df
 
                     st.session_state.df = st.session_state.df.sort_values('date')
-                    st.success("成功导入数据！")
                     # 保存更新后的数据
                     user_manager.save_user_data()
 
-                    # 显示导入的数据预览
-                    with st.expander("查看导入的数据"):
-                        st.dataframe(df.head())
+                    # 记下已导入的文件和预览，整页重新运行后其他页面显示导入后的数据
+                    st.session_state.imported_file_id = uploaded_file.file_id
+                    st.session_state.import_preview = df.head()
+                    st.rerun()
                 else:
                     missing_cols = [col for col in required_columns if col not in df.columns]
                     st.error(f"文件格式错误，缺少以下必要列：{', '.join(missing_cols)}")
@@ -610,10 +660,9 @@ with tabs[1]:
 
     st.markdown("<hr/>", unsafe_allow_html=True)
     st.markdown('<span class="lxh-subtle">🐾 今日打卡一下下，悄悄变更好～</span>', unsafe_allow_html=True)
-    # 在每个tab的末尾添加自动保存
-    for tab in tabs:
-        # 在tab内容结束后添加
-        user_manager.save_user_data()
+
+with tabs[1]:
+    render_add_record_tab()
 
 # ============ 趋势分析 =============
 with tabs[2]:
@@ -622,114 +671,287 @@ with tabs[2]:
         col1, col2 = st.columns(2)
         with col1:
             st.markdown("## <span class='small-icon'>📈</span> 体重趋势", unsafe_allow_html=True)
-            draw_picture.plot_weight_trend(df, st.session_state.target_weight)
+            draw_picture.plot_weight_trend(df, 90)
         with col2:
             st.markdown("## <span class='small-icon'>🔥</span> 热量收支", unsafe_allow_html=True)
             draw_picture.plot_calorie_balance(df)
     else:
         st.info("暂无数据，先添加记录吧~")
-    # 在每个tab的末尾添加自动保存
-    for tab in tabs:
-        # 在tab内容结束后添加
-        user_manager.save_user_data()
 # ============ 体重预测 =============
-with tabs[3]:
+def draw_prediction_figure(hist_df, pred, pred_days, figure_key):
+    """绘制历史体重与预测体重图表"""
+    fig, ax = plt.subplots(figsize=(14, 7))
+    # 历史数据
+    ax.plot(hist_df['date'], hist_df['weight'],
+            marker='o', markersize=4, linewidth=2,
+            color='#1f77b4', label="历史体重", alpha=0.8)
+    # 预测数据
+    pred_dates = [p['date'] for p in pred['predictions']]
+    pred_weights = [p['weight'] for p in pred['predictions']]
+    ax.plot(pred_dates, pred_weights,
+            marker='s', markersize=5, linewidth=2, linestyle='--',
+            color='#ff7f0e', label="预测体重", alpha=0.8)
+    # 蒙特卡洛预测的分位数区间
+    draw_picture.draw_prediction_bands(ax, pred_dates, pred.get('bands'))
+    # 目标线
+    if st.session_state.target_weight is not None:
+        target_weight = st.session_state.target_weight
+        ax.axhline(y=target_weight, color='red', linestyle=':', linewidth=2,
+                   alpha=0.7, label=f'目标体重: {target_weight}kg')
+    # 分隔线
+    last_hist_date = hist_df['date'].iloc[-1]
+    ax.axvline(x=last_hist_date, color='gray', linestyle='--', alpha=0.6, linewidth=1)
+    # 图表样式
+    ax.set_title(f"体重预测 ({pred_days}天)", fontsize=16, fontweight='bold', pad=20)
+    ax.set_xlabel('日期', fontsize=12)
+    ax.set_ylabel('体重 (kg)', fontsize=12)
+    ax.grid(True, linestyle='--', alpha=0.3)
+    ax.legend(loc='upper right', fontsize=10)
+    # Y轴范围
+    all_weights = list(hist_df['weight']) + pred_weights
+    for band in pred.get('bands', {}).values():
+        all_weights.extend(band)
+    if st.session_state.target_weight is not None:
+        all_weights.append(st.session_state.target_weight)
+    if all_weights:
+        min_weight = min(all_weights)
+        max_weight = max(all_weights)
+        padding = (max_weight - min_weight) * 0.15
+        ax.set_ylim(min_weight - padding, max_weight + padding)
+
+    fig.autofmt_xdate(rotation=45)
+    draw_picture.show_figure('prediction', figure_key, fig)
+
+
+@st.fragment(run_every=DATA.TRAINING_POLL_SECONDS)
+def render_training_status():
+    """后台训练进度，定时刷新；训练结束后整页重跑以生成预测"""
+    job = training_jobs.queue.status(st.session_state.current_user)
+    if job is None:
+        return
+    if job['status'] == training_jobs.QUEUED:
+        st.info(f"⏳ 模型训练排队中，前面还有 {job.get('position', 0)} 个任务...")
+    elif job['status'] == training_jobs.RUNNING:
+        epochs = job['epochs'] or 1
+        st.progress(min(job['epoch'] / epochs, 1.0), text=f"🧠 模型训练中：第 {job['epoch']} 轮")
+    else:
+        st.rerun()
+
+
+@st.fragment
+def render_prediction_tab():
+    """体重预测页：只在点击预测时计算，输入不变时直接显示缓存的结果"""
     st.header("🔮 体重预测")
 
     # 设置预测天数
     pred_days = st.slider("预测天数", 7, 90, 28, 7, key="pred_days_slider")
 
-    if st.session_state.df is None or len(st.session_state.df) < 10:
-        st.warning(
-            f"请先录入至少10条体重数据后再进行预测，当前只有{len(st.session_state.df) if st.session_state.df is not None else 0}条数据")
-    else:
-        # 导入必要的函数
-        from models import load_lstm, train_lstm, predict_future_lstm
+    method_label = st.radio("预测方法", list(FORECAST_METHODS), horizontal=True, key="forecast_method",
+                            help="能量平衡：按 摄入 − 基础代谢×活动系数 − 运动消耗 逐日推算，无需训练")
+    method = FORECAST_METHODS[method_label]
+    show_bands = st.checkbox(f"显示预测区间（蒙特卡洛 {DATA.ENSEMBLE_SAMPLES} 条轨迹）", value=True,
+                             key="forecast_bands", help="对计划的执行情况随机采样，给出体重预测的分位数范围")
+    samples = DATA.ENSEMBLE_SAMPLES if show_bands else 0
 
-        # 加载模型
-        model, scalers = load_lstm()
+    n_records = len(st.session_state.df) if st.session_state.df is not None else 0
+    if n_records == 0:
+        st.warning("请先录入体重数据后再进行预测")
+        return
+    if method == "lstm" and n_records < LSTM_MIN_RECORDS:
+        # 数据不足以训练LSTM时用能量平衡模型冷启动
+        st.info(f"LSTM模型需要至少{LSTM_MIN_RECORDS}条记录（当前{n_records}条），暂用能量平衡模型预测。")
+        method = "energy_balance"
+
+    inputs_key = prediction_inputs_key(pred_days, method, samples)
+    cached = st.session_state.get('prediction_result')
+    is_fresh = cached is not None and cached['key'] == inputs_key
+    # 只有预测天数变了：预测是确定性的且轨迹有缓存，截取或接着算即可，不需要再点击
+    horizon_changed = not is_fresh and cached is not None and cached['key'][0] == inputs_key[0]
+    if not is_fresh:
+        # 批量任务预存的预测仍然有效时，直接按天数截取，无需计算（拖动天数滑块时也优先读取）
+        stored = forecast_store.load_forecast(st.session_state.current_user, inputs_key[0], method, samples,
+                                              pred_days)
+        if stored is not None:
+            cached = {'key': inputs_key, 'pred': stored}
+            st.session_state.prediction_result = cached
+            is_fresh = True
+            horizon_changed = False
+
+    # 模型在后台训练，完成后自动接着预测
+    job = training_jobs.queue.status(st.session_state.current_user)
+    training = job is not None and job['status'] in training_jobs.ACTIVE_STATES
+    run_after_training = False
+    if st.session_state.get('predict_after_training') and not training:
+        st.session_state.predict_after_training = False
+        if job is not None and job['status'] == training_jobs.ERROR:
+            st.error(f"模型训练失败: {job['message']}")
+        else:
+            run_after_training = True
 
-        # 进行预测
-        with st.spinner("正在进行预测计算..."):
-            pred = predict_future_lstm(
+    clicked = st.button("🔮 开始预测" if cached is None else "🔄 重新预测", key="run_prediction",
+                        disabled=training and method == "lstm")
+    if clicked or horizon_changed or (run_after_training and method == "lstm"):
+        # 导入必要的函数
+        from models import load_lstm, predict_future_lstm, session_profile, is_model_fresh
+
+        pred = None
+        if method == "lstm":
+            # 加载模型
+            model, scalers = load_lstm()
+
+            if model is None:
+                # 没有模型时提交后台训练，不阻塞页面；训练期间先用能量平衡模型给出结果
+                training_jobs.queue.submit(st.session_state.current_user, st.session_state.df,
+                                           st.session_state.user_training_plan, st.session_state.diet_plan,
+                                           session_profile())
+                st.session_state.predict_after_training = True
+                training = True
+            else:
+                # 进行预测
+                with st.spinner("正在进行预测计算..."):
+                    pred = predict_future_lstm(
+                        st.session_state.df,
+                        model,
+                        scalers,
+                        pred_days,
+                        st.session_state.user_training_plan,
+                        st.session_state.diet_plan,
+                        samples=samples
+                    )
+
+                if pred['status'] != 'success':
+                    st.warning(f"{pred['message']}，改用能量平衡模型预测。")
+                    pred = None
+                # 模型不是用当前数据训练的：先显示这次结果，同时在后台更新模型，完成后自动重新预测
+                elif not is_model_fresh(st.session_state.df, st.session_state.user_training_plan,
+                                        st.session_state.diet_plan):
+                    training_jobs.queue.submit(st.session_state.current_user, st.session_state.df,
+                                               st.session_state.user_training_plan, st.session_state.diet_plan,
+                                               session_profile())
+                    st.session_state.predict_after_training = True
+                    training = True
+
+        if pred is None:
+            pred = energy_balance.predict_future_energy(
                 st.session_state.df,
-                model,
-                scalers,
                 pred_days,
                 st.session_state.user_training_plan,
-                st.session_state.diet_plan
+                st.session_state.diet_plan,
+                samples=samples
             )
+            if pred['status'] != 'success':
+                st.error(pred['message'])
+                return
+
+        cached = {'key': inputs_key, 'pred': pred}
+        st.session_state.prediction_result = cached
+        is_fresh = True
+
+    if training and method == "lstm":
+        render_training_status()
+        if cached is None:
+            st.info("模型训练完成后将自动生成预测。")
+            return
+        if cached['pred'].get('method') == "energy_balance":
+            st.info("LSTM模型训练中，下面先显示能量平衡模型的预测结果，训练完成后将自动更新。")
+        else:
+            st.info("模型正在用最新数据更新，完成后将自动刷新下面的预测结果。")
+    elif not is_fresh:
+        if cached is None:
+            st.info("点击“开始预测”生成体重预测。")
+        else:
+            st.info("数据、计划或预测天数已变化，请点击“重新预测”更新结果。")
+        return
 
-        if pred['status'] != 'success':
-            st.error(pred['message'])
-            st.stop()
+    pred = cached['pred']
+    # 显示上一次的结果时以它实际的预测天数为准
+    pred_days = len(pred['predictions'])
 
-        # 显示预测结果
+    # 显示预测结果
+    if is_fresh:
         st.success("预测完成！")
+    if pred.get('method') == "energy_balance":
+        st.caption("📐 本次结果来自能量平衡模型：每日体重变化 = (摄入 − 基础代谢×活动系数 − 运动消耗) / 7700 kcal")
+
+    # 结果显示
+    col1, col2, col3, col4 = st.columns(4)
+    with col1:
+        st.metric("当前体重", f"{pred['start_weight']:.2f} kg")
+    with col2:
+        st.metric(f"{pred_days}天后体重", f"{pred['end_weight']:.2f} kg")
+    with col3:
+        change = pred['weight_change']
+        st.metric("预计变化", f"{change:+.1f} kg",
+                  delta_color="inverse" if change > 0 else "normal")
+    with col4:
+        daily_change = change / pred_days
+        st.metric("日均变化", f"{daily_change:+.2f} kg/天")
+
+    # 绘制预测图表
+    hist_df = st.session_state.df.copy().sort_values('date')
+    if len(hist_df) > 90:
+        hist_df = hist_df.tail(90)
+    figure_key = fingerprint.object_fingerprint({
+        'inputs': cached['key'], 'predictions': pred['predictions'], 'target': st.session_state.target_weight
+    })
+    if not draw_picture.show_cached_figure('prediction', figure_key):
+        draw_prediction_figure(hist_df, pred, pred_days, figure_key)
+
+    # 个性化建议
+    st.markdown("### 💡 个性化建议")
+    recommendation.export_report(pred, st.session_state.target_weight)
+
+
+@st.fragment
+def render_scenario_comparison():
+    """方案对比：饮食计划 × 运动时长的全部组合一次批量预测，列表比较"""
+    st.markdown("### 🧪 方案对比")
+    if st.session_state.df is None or st.session_state.df.empty:
+        return
+
+    diet_plans = scenarios.default_diet_plans(st.session_state.diet_plan)
+    col1, col2, col3 = st.columns([3, 3, 1])
+    with col1:
+        diet_names = st.multiselect("饮食计划", list(diet_plans), default=list(diet_plans), key="scenario_diets")
+    with col2:
+        minutes = st.multiselect("每天运动时长(分钟)", list(DATA.SCENARIO_EXERCISE_MINUTES),
+                                 default=list(DATA.SCENARIO_EXERCISE_MINUTES), key="scenario_minutes")
+    with col3:
+        days = st.number_input("预测天数", 7, 180, 90, 7, key="scenario_days")
+
+    if not st.button("📊 对比方案", key="run_scenarios"):
+        cached = st.session_state.get('scenario_result')
+        if cached is None:
+            st.caption("选择饮食计划和运动时长后点击“对比方案”，一次预测所有组合。")
+            return
+    else:
+        grid = scenarios.scenario_grid({name: diet_plans[name] for name in diet_names}, sorted(minutes),
+                                       st.session_state.user_training_plan)
+        model = scalers = None
+        if st.session_state.get('forecast_method', "LSTM模型") == "LSTM模型":
+            model, scalers = models.load_lstm()
+        with st.spinner(f"正在预测 {len(grid)} 个方案..."):
+            result = scenarios.run_scenarios(
+                st.session_state.df, grid, int(days), st.session_state.target_weight,
+                st.session_state.user_training_plan, st.session_state.diet_plan,
+                model, scalers, activity_level=st.session_state.user_activity_level)
+        if result['status'] != 'success':
+            st.error(result['message'])
+            return
+        cached = st.session_state.scenario_result = result
+
+    method = "LSTM模型" if cached['method'] == "lstm" else "能量平衡模型"
+    if cached.get('note'):
+        method += f"（{cached['note']}）"
+    st.caption(f"共 {len(cached['table'])} 个方案，预测方法：{method}；“达到目标”为空表示预测期内达不到目标体重。")
+    st.dataframe(cached['table'], use_container_width=True, hide_index=True)
+
+
+with tabs[3]:
+    render_prediction_tab()
+    st.markdown("---")
+    render_scenario_comparison()
 
-        # 结果显示
-        col1, col2, col3, col4 = st.columns(4)
-        with col1:
-            st.metric("当前体重", f"{pred['start_weight']:.2f} kg")
-        with col2:
-            st.metric(f"{pred_days}天后体重", f"{pred['end_weight']:.2f} kg")
-        with col3:
-            change = pred['weight_change']
-            st.metric("预计变化", f"{change:+.1f} kg",
-                      delta_color="inverse" if change > 0 else "normal")
-        with col4:
-            daily_change = change / pred_days
-            st.metric("日均变化", f"{daily_change:+.2f} kg/天")
-
-        # 绘制预测图表
-        fig, ax = plt.subplots(figsize=(14, 7))
-        # 历史数据
-        hist_df = st.session_state.df.copy().sort_values('date')
-        if len(hist_df) > 90:
-            hist_df = hist.tail(90)
-        ax.plot(hist_df['date'], hist_df['weight'],
-                marker='o', markersize=4, linewidth=2,
-                color='#1f77b4', label="历史体重", alpha=0.8)
-        # 预测数据
-        pred_dates = [p['date'] for p in pred['predictions']]
-        pred_weights = [p['weight'] for p in pred['predictions']]
-        ax.plot(pred_dates, pred_weights,
-                marker='s', markersize=5, linewidth=2, linestyle='--',
-                color='#ff7f0e', label="预测体重", alpha=0.8)
-        # 目标线
-        if st.session_state.target_weight is not None:
-            target_weight = st.session_state.target_weight
-            ax.axhline(y=target_weight, color='red', linestyle=':', linewidth=2,
-                       alpha=0.7, label=f'目标体重: {target_weight}kg')
-        # 分隔线
-        last_hist_date = hist_df['date'].iloc[-1]
-        ax.axvline(x=last_hist_date, color='gray', linestyle='--', alpha=0.6, linewidth=1)
-        # 图表样式
-        ax.set_title(f"体重预测 ({pred_days}天)", fontsize=16, fontweight='bold', pad=20)
-        ax.set_xlabel('日期', fontsize=12)
-        ax.set_ylabel('体重 (kg)', fontsize=12)
-        ax.grid(True, linestyle='--', alpha=0.3)
-        ax.legend(loc='upper right', fontsize=10)
-        # Y轴范围
-        all_weights = list(hist_df['weight']) + pred_weights
-        if st.session_state.target_weight is not None:
-            all_weights.append(st.session_state.target_weight)
-        if all_weights:
-            min_weight = min(all_weights)
-            max_weight = max(all_weights)
-            padding = (max_weight - min_weight) * 0.15
-            ax.set_ylim(min_weight - padding, max_weight + padding)
-
-        fig.autofmt_xdate(rotation=45)
-        st.pyplot(fig)
-
-        # 个性化建议
-        st.markdown("### 💡 个性化建议")
-        recommendation.export_report(pred, st.session_state.target_weight)
-    # 在每个tab的末尾添加自动保存
-    for tab in tabs:
-        # 在tab内容结束后添加
-        user_manager.save_user_data()
 # ============ 个人设置 =============
 with tabs[4]:
     # 基本信息设置
@@ -760,9 +982,8 @@ with tabs[4]:
         )
         st.session_state.user_activity_level = st.selectbox(
             "活动水平",
-            ["久坐", "轻度活动", "中度活动", "高强度活动", "非常活跃"],
-            index=["久坐", "轻度活动", "中度活动", "高强度活动", "非常活跃"].index(
-                st.session_state.user_activity_level)
+            list(DATA.ACTIVITY_LEVELS),
+            index=list(DATA.ACTIVITY_LEVELS).index(st.session_state.user_activity_level)
         )
 
     # 目标体重设置
@@ -850,10 +1071,6 @@ with tabs[4]:
             st.rerun()
     else:
         st.info("暂无锻炼计划，请添加新的锻炼项目。")
-    # 在每个tab的末尾添加自动保存
-    for tab in tabs:
-        # 在tab内容结束后添加
-        user_manager.save_user_data()
     # ========== 饮食计划管理 ==========
     st.markdown("---")
     st.markdown("### 饮食计划")
@@ -998,10 +1215,9 @@ with tabs[4]:
             user_manager.save_user_data()
             st.success("饮食计划已清空。")
 
-    # 在每个tab的末尾添加自动保存
-    for tab in tabs:
-        # 在tab内容结束后添加
-        user_manager.save_user_data()
+
+# 每次rerun结束时统一保存一次，只写入发生变化的部分
+user_manager.save_user_data()
 
 # 页脚
 # 在页面底部添加登出按钮
@@ -0,0 +1,48 @@
+#机器学习后端的延迟加载：TensorFlow和scikit-learn只在训练/加载Keras模型时才导入
+
+import os
+import sys
+import threading
+
+_lock = threading.Lock()
+
+# 启动阶段不应加载的重量级模块
+HEAVY_MODULES = ('tensorflow', 'keras', 'sklearn')
+
+
+def keras():
+    """返回 tensorflow.keras，首次调用时才导入TensorFlow"""
+    with _lock:
+        import tensorflow as tf
+    return tf.keras
+
+
+def limit_threads(threads):
+    """
+    限制本进程TensorFlow/BLAS使用的线程数（多进程批量训练时每个进程一份）。
+    应在导入TensorFlow之前调用；已导入时尽量在运行时设置
+    """
+    threads = max(1, int(threads))
+    for name in ('OMP_NUM_THREADS', 'OPENBLAS_NUM_THREADS', 'MKL_NUM_THREADS',
+                 'TF_NUM_INTRAOP_THREADS', 'TF_NUM_INTEROP_THREADS'):
+        os.environ[name] = str(threads)
+    if 'tensorflow' in sys.modules:
+        tf = sys.modules['tensorflow']
+        try:
+            tf.config.threading.set_intra_op_parallelism_threads(threads)
+            tf.config.threading.set_inter_op_parallelism_threads(threads)
+        except RuntimeError:
+            # TensorFlow运行时已初始化，线程数不能再修改
+            pass
+
+
+def minmax_scaler():
+    """返回 sklearn 的 MinMaxScaler 类，首次调用时才导入scikit-learn"""
+    with _lock:
+        from sklearn.preprocessing import MinMaxScaler
+    return MinMaxScaler
+
+
+def loaded_modules():
+    """当前进程中已经导入的重量级模块"""
+    return [name for name in HEAVY_MODULES if name in sys.modules]
@@ -0,0 +1,80 @@
+#模型元数据：记录模型是用什么数据训练的，用来判断是否需要重新训练
+
+import json
+import os
+import platform
+import sys
+import time
+import DATA
+import fingerprint
+import model_registry
+
+# 元数据格式版本，字段含义变化时递增，旧版本的元数据视为过期
+META_VERSION = 1
+
+
+def library_versions():
+    """训练时的库版本（只记录已导入的库，不为此额外导入TensorFlow）"""
+    versions = {'python': platform.python_version()}
+    for name in ('numpy', 'pandas', 'sklearn', 'tensorflow', 'keras'):
+        module = sys.modules.get(name)
+        if module is not None:
+            versions[name] = getattr(module, '__version__', None)
+    return versions
+
+
+def build_metadata(username, inputs_key, df, training_plan, diet_plan, rows, duration, mode):
+    """训练完成后的模型元数据（模型和Scaler文件写好后调用）"""
+    dates = df['date'] if df is not None and 'date' in df.columns else None
+    return {
+        'version': META_VERSION,
+        'inputs_fingerprint': inputs_key,
+        'data_fingerprint': fingerprint.frame_fingerprint(df),
+        'training_plan_hash': fingerprint.object_fingerprint(training_plan),
+        'diet_plan_hash': fingerprint.object_fingerprint(diet_plan),
+        'rows': int(rows),
+        'first_date': str(dates.min()) if dates is not None and len(dates) else None,
+        'last_date': str(dates.max()) if dates is not None and len(dates) else None,
+        'mode': mode,
+        'trained_at': time.time(),
+        'duration_seconds': round(duration, 3),
+        'versions': library_versions(),
+        'model_files': _model_signature(username),
+    }
+
+
+def _model_signature(username):
+    signature = model_registry.file_signature(DATA.get_model_file(username), DATA.get_scaler_file(username))
+    return [list(item) for item in signature] if signature is not None else None
+
+
+def write_metadata(username, meta):
+    path = DATA.get_model_meta_file(username)
+    with open(path + ".tmp", "w", encoding="utf-8") as f:
+        json.dump(meta, f, ensure_ascii=False, indent=2)
+    os.replace(path + ".tmp", path)
+
+
+def read_metadata(username):
+    """读取模型元数据，不存在或损坏时返回None"""
+    path = DATA.get_model_meta_file(username)
+    if not os.path.exists(path):
+        return None
+    try:
+        with open(path, encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def is_fresh(username, inputs_key):
+    """
+    模型是否用当前这份输入训练过：元数据中的输入指纹一致，
+    且模型文件仍是当时写出的那一份（没有被删除或替换）
+    """
+    meta = read_metadata(username)
+    if meta is None or meta.get('version') != META_VERSION:
+        return False
+    if meta.get('inputs_fingerprint') != inputs_key:
+        return False
+    return meta.get('model_files') is not None and meta['model_files'] == _model_signature(username)
@@ -0,0 +1,108 @@
+#模型缓存：进程内按用户常驻已加载的模型
+
+import os
+import threading
+from collections import OrderedDict
+import DATA
+
+
+def file_signature(*paths):
+    """文件的(路径, 修改时间, 大小)，任一文件不存在或为空时返回None"""
+    signature = []
+    for path in paths:
+        if not os.path.exists(path):
+            return None
+        stat = os.stat(path)
+        if stat.st_size == 0:
+            return None
+        signature.append((path, stat.st_mtime_ns, stat.st_size))
+    return tuple(signature)
+
+
+def estimate_model_bytes(model):
+    """估算模型常驻内存：权重大小 + 固定的对象开销"""
+    try:
+        weights = sum(w.nbytes for w in model.get_weights())
+    except Exception:
+        weights = 0
+    return weights + DATA.MODEL_CACHE_ENTRY_OVERHEAD
+
+
+class ModelRegistry:
+    """
+    进程内模型缓存，按用户名索引。
+    模型文件修改时间/大小变化时自动失效，超出内存预算时淘汰最久未使用的模型。
+    """
+
+    def __init__(self, max_bytes=None):
+        self.max_bytes = DATA.MODEL_CACHE_MAX_BYTES if max_bytes is None else max_bytes
+        self._entries = OrderedDict()
+        self._lock = threading.RLock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, username, paths, loader):
+        """
+        获取用户模型，缓存未命中时调用loader(*paths)加载。
+        返回(model, scalers)，文件不可用时返回(None, None)
+        """
+        signature = file_signature(*paths)
+        if signature is None:
+            self.invalidate(username)
+            return None, None
+
+        with self._lock:
+            entry = self._entries.get(username)
+            if entry is not None and entry['signature'] == signature:
+                self._entries.move_to_end(username)
+                self.hits += 1
+                return entry['model'], entry['scalers']
+
+        # 加载放在锁外，避免一个用户的加载阻塞其它用户
+        model, scalers = loader(*paths)
+        self.misses += 1
+        if model is None or scalers is None:
+            return model, scalers
+
+        with self._lock:
+            self._entries[username] = {
+                'signature': signature,
+                'model': model,
+                'scalers': scalers,
+                'nbytes': estimate_model_bytes(model),
+            }
+            self._entries.move_to_end(username)
+            self._evict()
+        return model, scalers
+
+    def invalidate(self, username):
+        """移除用户的缓存模型（重新训练或删除模型文件后调用）"""
+        with self._lock:
+            self._entries.pop(username, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def total_bytes(self):
+        with self._lock:
+            return sum(entry['nbytes'] for entry in self._entries.values())
+
+    def _evict(self):
+        # 至少保留最近使用的一个模型
+        while len(self._entries) > 1 and self.total_bytes() > self.max_bytes:
+            self._entries.popitem(last=False)
+
+    def stats(self):
+        with self._lock:
+            return {
+                'models': len(self._entries),
+                'bytes': self.total_bytes(),
+                'max_bytes': self.max_bytes,
+                'hits': self.hits,
+                'misses': self.misses,
+            }
+
+
+# 进程级共享的模型缓存
+registry = ModelRegistry()
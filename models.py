@@ -1,30 +1,70 @@
 #LSTM预测模型
 
 import pickle
-from tensorflow.keras.models import Sequential, load_model
-from tensorflow.keras.layers import LSTM, Dense
-from tensorflow.keras.callbacks import EarlyStopping, ReduceLROnPlateau
-from sklearn.preprocessing import MinMaxScaler
 import pandas as pd
 import os
+import time
 import streamlit as st
 import bmi_calculation
 import numpy as np
 import Plan
 import DATA
+import health_log
+import storage
+import model_registry
+import lstm_numpy
+import ml_backend
+import feature_cache
+import fingerprint
+import forecast_ensemble
+import forecast_cache
+import model_meta
+
+# 特征计算用到的用户资料及其默认值
+PROFILE_DEFAULTS = {
+    'user_height': 170.0,
+    'user_age': 30,
+    'user_sex': "男",
+}
+
+# LSTM的输入特征列
+FEATURE_COLUMNS = ['day_of_week', 'planned_exercise', 'planned_calorie_intake']
+
+# 健康减重范围：每周0.5-1kg，预测的每日变化不超过 1kg/7（约0.14kg/天）
+MAX_DAILY_CHANGE = 1.0 / 7
+# 每日体重的合理波动（±0.3kg）
+DAILY_FLUCTUATION = 0.3
+
+def session_profile() -> dict:
+    """当前会话的用户资料（身高、年龄、性别），未设置的项使用默认值"""
+    profile = dict(PROFILE_DEFAULTS)
+    if hasattr(st, 'session_state'):
+        for key in PROFILE_DEFAULTS:
+            if hasattr(st.session_state, key):
+                profile[key] = getattr(st.session_state, key)
+    return profile
+
+def profile_from_config(config: dict) -> dict:
+    """从保存的用户配置中取出用户资料（离线任务用，不依赖会话）"""
+    return {key: config.get(key, default) for key, default in PROFILE_DEFAULTS.items()}
+
+def _session_user():
+    # 检查session_state是否已初始化
+    if hasattr(st, 'session_state') and hasattr(st.session_state, 'current_user'):
+        return st.session_state.current_user
+    return None
 
 def load_data(path: str = None) -> pd.DataFrame:
     """加载健康数据"""
-    # 在函数内部获取路径
+    # 未指定路径时从当前用户的存储后端读取
     if path is None:
-        # 检查session_state是否已初始化
-        if hasattr(st, 'session_state') and hasattr(st.session_state, 'current_user'):
-            path = DATA.get_data_file(st.session_state.current_user)
-        else:
-            path = DATA.get_data_file()  # 使用默认路径
+        username = _session_user()
+        if username is not None:
+            return storage.get_store().load(username)
+        path = DATA.get_data_file()  # 使用默认路径
 
-    if os.path.exists(path):
-        df = pd.read_csv(path)
+    if os.path.exists(path) or os.path.exists(health_log.get_log_file(path)):
+        df = health_log.read_records(path)
         if 'date' in df.columns:
             df['date'] = pd.to_datetime(df['date'], errors='coerce', format='mixed')
             df = df.dropna(subset=['date'])
@@ -33,17 +73,45 @@ def load_data(path: str = None) -> pd.DataFrame:
         return pd.DataFrame(columns=['date', 'weight', 'height', 'exercise_type', 'exercise_time', 'calorie_intake'])
 
 def save_data(df: pd.DataFrame, path: str = None) -> None:
-    """保存健康数据"""
+    """保存健康数据（整体重写）"""
     if path is None:
-        # 检查session_state是否已初始化
-        if hasattr(st, 'session_state') and hasattr(st.session_state, 'current_user'):
-            path = DATA.get_data_file(st.session_state.current_user)
-        else:
-            path = DATA.get_data_file()  # 使用默认路径
-    df.to_csv(path, index=False)
-
-def build_base_training_frame(df: pd.DataFrame) -> pd.DataFrame:
+        username = _session_user()
+        if username is not None:
+            storage.get_store().save(username, df)
+            return
+        path = DATA.get_data_file()
+    health_log.write_snapshot(df, path)
+
+def append_data(records: pd.DataFrame, path: str = None) -> None:
+    """追加健康记录，同一日期的新记录会覆盖旧记录"""
+    if path is None:
+        username = _session_user()
+        if username is not None:
+            storage.get_store().append(username, records)
+            return
+        path = DATA.get_data_file()
+    health_log.append_records(records, path)
+
+def load_recent(days: int, df: pd.DataFrame = None) -> pd.DataFrame:
+    """
+    最近days天的记录：传入df时在df中过滤（与调用方手里的数据一致，不论存储后端）；
+    不传df时从当前用户已保存的数据中读取，支持索引查询的后端只读取需要的行
+    """
+    username = _session_user()
+    if df is None and username is not None:
+        return storage.get_store().load_recent(username, days)
+    return storage.recent_rows(df, days)
+
+def load_tail(n: int, df: pd.DataFrame = None) -> pd.DataFrame:
+    """最后n条记录：传入df时在df中截取，不传df时从当前用户已保存的数据中读取（同 load_recent）"""
+    username = _session_user()
+    if df is None and username is not None:
+        return storage.get_store().load_tail(username, n)
+    return storage.tail_rows(df, n)
+
+def build_base_training_frame(df: pd.DataFrame, profile: dict = None) -> pd.DataFrame:
     """基础的数据处理框架"""
+    profile = profile or session_profile()
     data = df.copy().sort_values('date')
     data['days_since_start'] = (data['date'] - data['date'].min()).dt.days
 
@@ -52,7 +120,7 @@ def build_base_training_frame(df: pd.DataFrame) -> pd.DataFrame:
         'exercise_type': '无',
         'exercise_time': 30,
         'calorie_intake': data['weight'] * 30 if 'weight' in data.columns else 0,
-        'height': st.session_state.user_height if hasattr(st, 'session_state') and hasattr(st.session_state, 'user_height') else 170.0
+        'height': profile['user_height']
     }
 
     for col, default_val in default_values.items():
@@ -62,18 +130,11 @@ def build_base_training_frame(df: pd.DataFrame) -> pd.DataFrame:
             data[col] = data[col].fillna(default_val)
 
     # 计算BMI
-    data['bmi'] = data.apply(
-        lambda r: bmi_calculation.calculate_bmi(r['weight'], r['height']),
-        axis=1
-    )
-
-    # 使用科学BMR计算基础代谢 - 移到函数内部检查
-    user_age = st.session_state.user_age if hasattr(st, 'session_state') and hasattr(st.session_state, 'user_age') else 30
-    user_sex = st.session_state.user_sex if hasattr(st, 'session_state') and hasattr(st.session_state, 'user_sex') else "男"
+    data['bmi'] = bmi_calculation.calculate_bmi_array(data['weight'], data['height'])
 
-    data['basal_metabolism'] = data.apply(
-        lambda r: bmi_calculation.calculate_bmr(r['weight'], r['height'], user_age, user_sex),
-        axis=1
+    # 使用科学BMR计算基础代谢
+    data['basal_metabolism'] = bmi_calculation.calculate_bmr_array(
+        data['weight'], data['height'], profile['user_age'], profile['user_sex']
     )
 
     # 计算运动消耗
@@ -136,9 +197,17 @@ def check_abnormal(df: pd.DataFrame):
     if not abnormal_days.empty:
         st.error(f"⚠️ 检测到体重波动异常（超过3kg）: {abnormal_days['date'].dt.strftime('%Y-%m-%d').tolist()}")
 
-def build_training_frame(df: pd.DataFrame, training_plan=None, diet_plan=None) -> pd.DataFrame:
-    """增强版的数据处理框架，包含锻炼计划和饮食计划的影响"""
-    data = build_base_training_frame(df)
+def build_training_frame(df: pd.DataFrame, training_plan=None, diet_plan=None, profile: dict = None) -> pd.DataFrame:
+    """
+    增强版的数据处理框架，包含锻炼计划和饮食计划的影响。
+    结果按 (数据, 计划, 用户资料) 的内容指纹缓存，训练和预测共用；返回的表是共享的，不要原地修改
+    """
+    profile = profile or session_profile()
+    key = feature_cache.feature_key(df, training_plan, diet_plan, profile)
+    return feature_cache.cache.get(key, lambda: _build_training_frame(df, training_plan, diet_plan, profile))
+
+def _build_training_frame(df, training_plan, diet_plan, profile):
+    data = build_base_training_frame(df, profile)
 
     # 添加日期相关特征
     if 'day_of_week' not in data.columns:
@@ -148,161 +217,398 @@ def build_training_frame(df: pd.DataFrame, training_plan=None, diet_plan=None) -
     data['planned_exercise'] = 0
     data['planned_calorie_intake'] = 0
 
-    # 如果有锻炼计划，计算计划执行情况
-    if training_plan is not None and not training_plan.empty:
-        data['planned_exercise'] = data.apply(
-            lambda r: Plan.get_planned_exercise(r['date'], training_plan), axis=1
-        )
-
-    # 如果有饮食计划，计算计划热量
-    if diet_plan is not None and not diet_plan.empty:
-        data['planned_calorie_intake'] = data.apply(
-            lambda r: Plan.get_planned_calories(r['date'], diet_plan), axis=1
-        )
+    # 计划编译为周计划表后按星期几一次取出
+    has_training = training_plan is not None and not training_plan.empty
+    has_diet = diet_plan is not None and not diet_plan.empty
+    if (has_training or has_diet) and not data.empty:
+        planned = Plan.planned_features(data['date'], training_plan, diet_plan)
+        if has_training:
+            data['planned_exercise'] = planned[:, 0]
+        if has_diet:
+            data['planned_calorie_intake'] = planned[:, 1]
 
     return data
 
-def build_training_sequences(df: pd.DataFrame, training_plan=None, diet_plan=None, seq_len: int = 7):
-    """构建训练序列，目标为 Δweight"""
-    data = build_training_frame(df, training_plan, diet_plan)
-
-    if len(data) < seq_len + 1:
-        st.warning(f"数据不足: 需要至少{seq_len + 1}条记录，当前只有{len(data)}条")
-        return None, None, None
-
-    # 特征列
-    feature_columns = ['day_of_week', 'planned_exercise', 'planned_calorie_intake']
+def sliding_windows(values, seq_len: int = 7, dtype=np.float32):
+    """
+    values 中所有长度为 seq_len 的连续窗口，形状 (n - seq_len + 1, seq_len, n_features)。
+    返回的是只读的跨步视图，窗口之间共享内存，只有转换dtype时复制一次原数组
+    """
+    values = np.asarray(values, dtype=dtype)
+    return np.lib.stride_tricks.sliding_window_view(values, seq_len, axis=0).transpose(0, 2, 1)
 
-    # 确保所有特征列都存在
-    for col in feature_columns:
-        if col not in data.columns:
-            data[col] = 0
+_window_batches_class = None
 
-    # 构建特征
-    features = data[feature_columns].fillna(0).values
+def make_window_batches(x, y, batch_size: int = 32, shuffle: bool = True):
+    """
+    按批次读取训练窗口的Keras数据集，每次只把一个batch复制为连续数组，
+    避免把全部窗口一次性展开成 (N, seq_len, n_features) 的张量
+    """
+    global _window_batches_class
+    if _window_batches_class is None:
+        # 基类来自Keras，首次训练时才定义
+        class WindowBatches(ml_backend.keras().utils.Sequence):
+            def __init__(self, x, y, batch_size, shuffle):
+                super().__init__()
+                self.x, self.y = x, y
+                self.batch_size = batch_size
+                self.shuffle = shuffle
+                self.order = np.arange(len(x))
+                if shuffle:
+                    np.random.shuffle(self.order)
+
+            def __len__(self):
+                return int(np.ceil(len(self.x) / self.batch_size))
+
+            def __getitem__(self, index):
+                idx = np.sort(self.order[index * self.batch_size:(index + 1) * self.batch_size])
+                return self.x[idx], self.y[idx]
+
+            def on_epoch_end(self):
+                # 与 model.fit(shuffle=True) 一致，每轮打乱样本顺序
+                if self.shuffle:
+                    np.random.shuffle(self.order)
+
+        _window_batches_class = WindowBatches
+    return _window_batches_class(x, y, batch_size, shuffle)
+
+def training_arrays(data: pd.DataFrame):
+    """特征表 -> (未标准化的特征, Δweight目标)"""
+    # 构建特征（缺少的特征列补0）
+    features = data.reindex(columns=FEATURE_COLUMNS, fill_value=0).fillna(0).values
 
     # 构建目标（Δweight）
     target = data['weight'].diff().fillna(0).values.reshape(-1, 1)
+    return features, target
 
-    # 标准化
-    scaler_x = MinMaxScaler(feature_range=(0, 1))
-    scaler_y = MinMaxScaler(feature_range=(0, 1))
+def build_training_sequences(df: pd.DataFrame, training_plan=None, diet_plan=None, seq_len: int = 7,
+                             dtype=np.float32, profile: dict = None, scalers=None):
+    """
+    构建训练序列，目标为 Δweight。
+    x 是特征数组上的滑动窗口视图（不逐窗口复制），内存为 O(N × n_features)。
+    传入scalers时沿用已有的标准化参数（增量训练），否则重新拟合
+    """
+    data = build_training_frame(df, training_plan, diet_plan, profile)
 
-    features_scaled = scaler_x.fit_transform(features)
-    target_scaled = scaler_y.fit_transform(target)
+    if len(data) < seq_len + 1:
+        st.warning(f"数据不足: 需要至少{seq_len + 1}条记录，当前只有{len(data)}条")
+        return None, None, None
 
-    x, y = [], []
-    for i in range(seq_len, len(features_scaled)):
-        x.append(features_scaled[i - seq_len:i])
-        y.append(target_scaled[i])
+    features, target = training_arrays(data)
+
+    # 标准化
+    if scalers is None:
+        MinMaxScaler = ml_backend.minmax_scaler()
+        scaler_x = MinMaxScaler(feature_range=(0, 1))
+        scaler_y = MinMaxScaler(feature_range=(0, 1))
+        features_scaled = scaler_x.fit_transform(features)
+        target_scaled = scaler_y.fit_transform(target)
+    else:
+        scaler_x, scaler_y = scalers
+        features_scaled = scaler_x.transform(features)
+        target_scaled = scaler_y.transform(target)
+
+    # 第i个样本：前seq_len天的特征 -> 第i天的 Δweight
+    x = sliding_windows(features_scaled, seq_len, dtype)[:-1]
+    y = target_scaled[seq_len:].astype(dtype)
 
     if len(x) == 0:
         st.error("无法构建训练序列：序列长度太短")
         return None, None, None
 
-    return np.array(x), np.array(y), (scaler_x, scaler_y)
+    return x, y, (scaler_x, scaler_y)
+
+def _replace_file(path, write):
+    """先写临时文件再替换，读取方不会看到写了一半的文件"""
+    root, ext = os.path.splitext(path)
+    tmp_path = root + ".tmp" + ext
+    write(tmp_path)
+    os.replace(tmp_path, path)
 
-def train_lstm(df, user_training_plan, diet_plan):
+def _dump_pickle(obj, path):
+    with open(path, "wb") as f:
+        pickle.dump(obj, f)
+
+def warm_start_policy(features, target, scalers):
+    """
+    判断已有模型能否在新数据上增量训练，返回 (是否可以, 原因)。
+    新增数据过多、超出原标准化范围或分布明显漂移时需要完整重训
+    """
+    scaler_x, scaler_y = scalers
+    if not hasattr(scaler_x, 'data_range_') or not hasattr(scaler_x, 'n_samples_seen_'):
+        return False, "已有Scaler不支持增量训练"
+
+    trained_rows = int(scaler_x.n_samples_seen_)
+    new_rows = len(features) - trained_rows
+    if new_rows < 0:
+        return False, "历史数据减少，需要重新训练"
+    if new_rows > DATA.WARM_START_MAX_NEW_FRACTION * trained_rows:
+        return False, f"新增数据过多（{new_rows}条）"
+
+    # 标准化范围：新数据超出原范围的比例
+    for scaler, values, name in ((scaler_x, features, "特征"), (scaler_y, target, "体重变化")):
+        data_range = np.where(scaler.data_range_ > 0, scaler.data_range_, 1.0)
+        overflow = np.maximum((scaler.data_min_ - values.min(axis=0)) / data_range,
+                              (values.max(axis=0) - scaler.data_max_) / data_range)
+        if overflow.max() > DATA.WARM_START_RANGE_TOLERANCE:
+            return False, f"{name}超出原标准化范围"
+
+    # 分布漂移：新增数据的 Δweight 均值相对历史均值的z值
+    if new_rows > 0:
+        old, new = target[:trained_rows, 0], target[trained_rows:, 0]
+        std_error = (old.std() or 1e-6) / np.sqrt(new_rows)
+        if abs(new.mean() - old.mean()) / std_error > DATA.WARM_START_DRIFT_Z:
+            return False, "体重变化趋势明显漂移"
+
+    return True, f"新增{new_rows}条数据"
+
+def _load_warm_start(username):
+    """读取已有的Keras模型和Scaler作为增量训练的起点，没有或读取失败时返回None"""
+    model_path = DATA.get_model_file(username)
+    scaler_path = DATA.get_scaler_file(username)
+    if model_registry.file_signature(model_path, scaler_path) is None:
+        return None
+    try:
+        return _load_model_files(model_path, scaler_path)
+    except Exception:
+        return None
+
+def is_model_fresh(df, training_plan=None, diet_plan=None, profile: dict = None, username: str = None) -> bool:
+    """已保存的模型是否正是用这份数据、计划和用户资料训练的（无需重新训练）"""
+    profile = profile or session_profile()
+    username = username or _session_user()
+    return model_meta.is_fresh(username, feature_cache.feature_key(df, training_plan, diet_plan, profile))
+
+def train_lstm(df, user_training_plan, diet_plan, profile: dict = None, username: str = None, progress=None,
+               warm_start: bool = True, force: bool = False):
     """
-    训练 LSTM 模型，并返回特征数量
+    训练 LSTM 模型，并返回特征数量。
+    username/profile 不传时取当前会话的；progress(epoch, epochs) 在每轮训练结束时调用（后台训练用来汇报进度）。
+    warm_start 为True且已有模型时先尝试增量训练（少量轮次微调），不满足条件时完整重训。
+    已有模型正是用相同输入训练的时直接跳过，force=True 时强制训练
     """
-    # 构建训练数据
-    training_data = build_training_frame(df, user_training_plan, diet_plan)
+    profile = profile or session_profile()
+    username = username or _session_user()
+    inputs_key = feature_cache.feature_key(df, user_training_plan, diet_plan, profile)
+    if not force and model_meta.is_fresh(username, inputs_key):
+        return {"status": "success", "n_features": len(FEATURE_COLUMNS), "mode": "skipped",
+                "reason": "训练数据未变化，沿用已有模型"}
+
+    started = time.perf_counter()
+    # 构建训练数据（与下面的序列构建、之后的预测共用同一份特征表）
+    training_data = build_training_frame(df, user_training_plan, diet_plan, profile)
 
     if len(training_data) < 8:  # 至少需要序列长度+1条记录
         return {"status": "error", "message": f"数据不足，需要至少8条记录，当前只有{len(training_data)}条"}
 
-    # 构建训练序列
-    x, y, scalers = build_training_sequences(df, user_training_plan, diet_plan, seq_len=7)
+    # 已有模型时判断能否增量训练
+    mode, reason = "full", "没有可用的已有模型"
+    existing = _load_warm_start(username) if warm_start else None
+    meta = model_meta.read_metadata(username)
+    if existing is not None and meta is not None and (
+            meta.get('training_plan_hash') != fingerprint.object_fingerprint(user_training_plan) or
+            meta.get('diet_plan_hash') != fingerprint.object_fingerprint(diet_plan)):
+        # 计划变化后历史上每一天的计划特征都变了，需要完整重训
+        reason = "训练或饮食计划已变化"
+    elif existing is not None:
+        features, target = training_arrays(training_data)
+        can_warm_start, reason = warm_start_policy(features, target, existing[1])
+        if can_warm_start:
+            mode = "warm_start"
+    elif not warm_start:
+        reason = "未启用增量训练"
+
+    # 构建训练序列（增量训练沿用原模型的标准化参数）
+    x, y, scalers = build_training_sequences(df, user_training_plan, diet_plan, seq_len=7, profile=profile,
+                                             scalers=existing[1] if mode == "warm_start" else None)
 
     if x is None or y is None:
         return {"status": "error", "message": "无法构建训练序列"}
 
     n_features = x.shape[2]  # 获取特征数量
 
-    # 创建并编译模型
-    model = Sequential()
-    model.add(LSTM(50, activation='relu', input_shape=(x.shape[1], x.shape[2])))
-    model.add(Dense(1))
-    model.compile(optimizer='adam', loss='mse')
-
-    # 添加回调函数
-    callbacks = [
-        EarlyStopping(monitor='loss', patience=10, restore_best_weights=True),
-        ReduceLROnPlateau(monitor='loss', factor=0.5, patience=5, min_lr=0.0001)
-    ]
-
-    # 训练模型
-    model.fit(x, y, epochs=100, batch_size=32, verbose=0, callbacks=callbacks)
-
-    # 保存模型和Scaler
-    model_path = DATA.get_model_file(st.session_state.current_user)
-    scaler_path = DATA.get_scaler_file(st.session_state.current_user)
-
-    model.save(model_path)
-    with open(scaler_path, "wb") as f:
-        pickle.dump(scalers, f)  # 保存 scaler
-
-    return {"status": "success", "n_features": n_features}
-
-
-def load_lstm():
+    keras = ml_backend.keras()
+    if mode == "warm_start":
+        # 在原模型上用较小的学习率微调最近的窗口，同时回放一部分历史窗口避免遗忘
+        model = existing[0]
+        model.compile(optimizer=keras.optimizers.Adam(learning_rate=DATA.WARM_START_LEARNING_RATE), loss='mse')
+        new_rows = len(training_data) - int(scalers[0].n_samples_seen_)
+        recent = min(len(x), max(DATA.WARM_START_REPLAY_WINDOWS, 4 * new_rows))
+        x, y = x[-recent:], y[-recent:]
+        epochs = DATA.WARM_START_EPOCHS
+        callbacks = []
+        # 下次增量训练以本次的数据量为基准
+        for scaler in scalers:
+            scaler.n_samples_seen_ = len(training_data)
+    else:
+        # 创建并编译模型（首次训练时才导入TensorFlow）
+        model = keras.models.Sequential()
+        model.add(keras.layers.LSTM(50, activation='relu', input_shape=(x.shape[1], x.shape[2])))
+        model.add(keras.layers.Dense(1))
+        model.compile(optimizer='adam', loss='mse')
+
+        # 添加回调函数
+        epochs = 100
+        callbacks = [
+            keras.callbacks.EarlyStopping(monitor='loss', patience=10, restore_best_weights=True),
+            keras.callbacks.ReduceLROnPlateau(monitor='loss', factor=0.5, patience=5, min_lr=0.0001)
+        ]
+    if progress is not None:
+        callbacks.append(keras.callbacks.LambdaCallback(
+            on_epoch_end=lambda epoch, logs: progress(epoch + 1, epochs)))
+
+    # 训练模型（按batch从窗口视图中取数据）
+    model.fit(make_window_batches(x, y, batch_size=32), epochs=epochs, verbose=0, callbacks=callbacks)
+
+    # 保存模型和Scaler（训练可能在后台进行，页面随时可能读取这些文件）
+    _replace_file(DATA.get_model_file(username), model.save)
+    _replace_file(DATA.get_scaler_file(username), lambda path: _dump_pickle(scalers, path))
+    # 导出NumPy推理文件，失败时保留Keras模型即可
     try:
-        # 检查模型文件和Scaler文件是否存在
-        model_path = DATA.get_model_file(st.session_state.current_user)
-        scaler_path = DATA.get_scaler_file(st.session_state.current_user)
-
-        if os.path.exists(model_path) and os.path.exists(scaler_path):
-            # 确保文件不为空
-            if os.path.getsize(model_path) > 0 and os.path.getsize(scaler_path) > 0:
-                # 清除任何现有的Keras会话，避免冲突
-                import tensorflow as tf
-                tf.keras.backend.clear_session()
-
-                # 加载模型
-                model = load_model(model_path, compile=False)
-                model.compile(optimizer="adam", loss="mse")
-
-                # 加载scaler
-                with open(scaler_path, "rb") as f:
-                    scalers = pickle.load(f)
-                return model, scalers
-
-        # 如果模型或Scaler不可用，返回None
-        return None, None
+        lstm_numpy.export_model(model, scalers, DATA.get_numpy_model_file(username))
+    except Exception as e:
+        st.warning(f"NumPy推理文件导出失败，将使用Keras模型预测: {str(e)}")
+    model_registry.registry.invalidate(username)
+    # 记录模型的训练输入，输入不变时下次可以跳过训练
+    model_meta.write_metadata(username, model_meta.build_metadata(
+        username, inputs_key, df, user_training_plan, diet_plan,
+        rows=len(training_data), duration=time.perf_counter() - started, mode=mode))
+
+    return {"status": "success", "n_features": n_features, "mode": mode, "reason": reason}
+
+
+def _load_model_files(model_path, scaler_path):
+    """从磁盘加载模型和Scaler"""
+    model = ml_backend.keras().models.load_model(model_path, compile=False)
+    model.compile(optimizer="adam", loss="mse")
+
+    with open(scaler_path, "rb") as f:
+        scalers = pickle.load(f)
+    return model, scalers
+
+def load_lstm(username: str = None):
+    """加载用户的模型和Scaler，username 不传时取当前会话的；没有模型时返回 (None, None)"""
+    username = username or _session_user()
+    # 检查模型文件和Scaler文件是否存在
+    model_path = DATA.get_model_file(username)
+    scaler_path = DATA.get_scaler_file(username)
+    try:
+        # 模型常驻进程内缓存，文件变化（重新训练）后自动重新加载
+        # 优先使用导出的NumPy推理文件，预测时无需TensorFlow
+        if lstm_numpy.is_export_fresh(username):
+            return model_registry.registry.get(username, (DATA.get_numpy_model_file(username),),
+                                               lstm_numpy.load_model_file)
+        return model_registry.registry.get(username, (model_path, scaler_path), _load_model_files)
     except Exception as e:
         st.error(f"模型加载错误: {str(e)}")
+        model_registry.registry.invalidate(username)
         # 删除损坏的文件以便重新训练
         if os.path.exists(model_path):
             os.remove(model_path)
         if os.path.exists(scaler_path):
             os.remove(scaler_path)
+        meta_path = DATA.get_model_meta_file(username)
+        if os.path.exists(meta_path):
+            os.remove(meta_path)
         return None, None
 
-def apply_reasonable_constraints(pred_weight, current_weight, historical_weights):
-    # 健康减重范围：每周0.5-1kg
-    max_weekly_loss = 1.0  # kg/周
-    max_daily_change = max_weekly_loss / 7  # 约0.14kg/天
-
-    # 约束每日变化
-    if pred_weight < current_weight - max_daily_change:
-        constrained_weight = current_weight - max_daily_change
-    elif pred_weight > current_weight + max_daily_change:
-        constrained_weight = current_weight + max_daily_change
+def rollout_constrained(last_weight, deltas, fluctuation=None):
+    """
+    把预测的每日体重变化逐日累加为体重轨迹：deltas 形状 (samples, days)，所有样本同时计算，
+    每日变化限制在 ±MAX_DAILY_CHANGE（健康减重每周0.5-1kg）内并加入波动，返回每天的体重 (samples, days)。
+    last_weight 可以是每条轨迹各自的起点 (samples,)；
+    fluctuation 为[-1, 1]内的每日波动 (samples, days)，None 时不加波动（方案对比时各方案的差别只来自计划本身）
+    """
+    deltas = np.atleast_2d(deltas)
+    weights = np.empty(deltas.shape)
+    current = np.broadcast_to(np.asarray(last_weight, dtype=float), deltas.shape[:1]).copy()
+    for day in range(deltas.shape[1]):
+        constrained = np.clip(current + deltas[:, day], current - MAX_DAILY_CHANGE, current + MAX_DAILY_CHANGE)
+        if fluctuation is not None:
+            constrained += DAILY_FLUCTUATION * fluctuation[:, day]
+        current = np.round(constrained, 1)
+        weights[:, day] = current
+    return weights
+
+
+def build_rollout_windows(history_scaled, future_scaled, seq_len: int = 7):
+    """
+    构建逐日滚动预测的全部输入窗口：第i个预测日的窗口为
+    历史最后seq_len天与前i个预测日特征拼接后的最后seq_len行，形状 (days, seq_len, n_features)。
+    future_scaled 可以带前置的样本维 (samples, days, n_features)，此时返回 (samples, days, seq_len, n_features)
+    """
+    future_scaled = np.asarray(future_scaled, dtype=np.float32)
+    lead, days = future_scaled.shape[:-2], future_scaled.shape[-2]
+    history = np.broadcast_to(np.asarray(history_scaled[-seq_len:], dtype=np.float32),
+                              lead + (seq_len, future_scaled.shape[-1]))
+    combined = np.concatenate([history, future_scaled], axis=-2)
+    windows = np.lib.stride_tricks.sliding_window_view(combined, seq_len, axis=-2)
+    return np.ascontiguousarray(np.swapaxes(windows, -1, -2)[..., :days, :, :])
+
+def predict_deltas(model, windows):
+    """对一批输入窗口做一次前向计算，返回标准化的 Δweight，形状 (n, 1)"""
+    if hasattr(model, 'predict_on_batch'):
+        out = model.predict_on_batch(windows)
     else:
-        constrained_weight = pred_weight
-
-    # 添加合理波动（±0.3kg）
-    import random
-    daily_fluctuation = random.uniform(-0.3, 0.3)
-    constrained_weight += daily_fluctuation
-
-    return round(constrained_weight, 1)
+        out = model.predict(windows, verbose=0)
+    return np.asarray(out, dtype=float).reshape(-1, 1)
 
+def future_feature_matrix(pred_dates, planned_exercise, planned_calories):
+    """
+    预测日的模型输入特征（与 FEATURE_COLUMNS 同序）。
+    planned_exercise/planned_calories 可以带前置的轨迹维 (n, days)，返回 (n, days, n_features)
+    """
+    planned_exercise = np.asarray(planned_exercise, dtype=float)
+    planned_calories = np.asarray(planned_calories, dtype=float)
+    shape = np.broadcast_shapes(planned_exercise.shape, planned_calories.shape)
+    day_of_week = np.broadcast_to(pd.DatetimeIndex(pred_dates).dayofweek.values.astype(float), shape)
+    return np.stack([day_of_week,
+                     np.broadcast_to(planned_exercise, shape),
+                     np.broadcast_to(planned_calories, shape)], axis=-1)
+
+def lstm_trajectories(data: pd.DataFrame, model, scalers, future_features, seq_len: int = 7,
+                      fluctuation=None, start: int = 0, last_weights=None):
+    """
+    多条轨迹的LSTM滚动预测：future_features 形状 (n, days, n_features)，
+    所有轨迹、所有预测日的输入窗口合并成一个batch，只做一次前向计算，返回每天的体重 (n, days)。
+    start>0 时只计算第start天起的部分（续算），从 last_weights (n,) 接着累加，返回 (n, days - start)；
+    fluctuation 与返回的天数对应
+    """
+    scaler_x, scaler_y = scalers
+    future_features = np.asarray(future_features, dtype=float)
+    n_traj, days, n_features = future_features.shape
+    features_scaled = scaler_x.transform(data[FEATURE_COLUMNS].fillna(0).values)
+    future_scaled = scaler_x.transform(future_features.reshape(-1, n_features)).reshape(future_features.shape)
+    windows = build_rollout_windows(features_scaled, future_scaled, seq_len)[:, start:]
+    delta_scaled = predict_deltas(model, windows.reshape(-1, seq_len, n_features))
+    delta_weights = scaler_y.inverse_transform(delta_scaled)[:, 0].reshape(n_traj, days - start)
+    if last_weights is None:
+        last_weights = float(data.iloc[-1]['weight'])
+    # 体重约束依赖前一天的结果，逐日计算，所有轨迹同时进行
+    return rollout_constrained(last_weights, delta_weights, fluctuation)
+
+def model_version(model, scalers) -> str:
+    """模型权重和Scaler参数的指纹（重新训练或增量训练后变化）"""
+    return fingerprint.object_fingerprint([model.get_weights(), scalers])
+
+def smooth_predictions(preds):
+    """单条预测轨迹的体重做3天居中滑动平均"""
+    preds_df = pd.DataFrame(preds)
+    preds_df['weight'] = preds_df['weight'].rolling(window=3, min_periods=1, center=True).mean()
+    return preds_df.to_dict(orient="records")
 
 def predict_future_lstm(df: pd.DataFrame, model=None, scalers=None, days: int = 28,
-                        training_plan=None, diet_plan=None, seq_len: int = 7):
-    """预测未来体重（基于 Δweight 累加）"""
+                        training_plan=None, diet_plan=None, seq_len: int = 7, profile: dict = None,
+                        samples: int = 0, smooth: bool = True, seed: int = None):
+    """
+    预测未来体重（基于 Δweight 累加）。
+    samples>0 时为蒙特卡洛预测：对计划执行情况采样 samples 条轨迹，一次前向计算，
+    体重取中位数，并在结果的 bands 中给出各分位数区间。
+    smooth=False 时返回未平滑的单条轨迹（预存后按天数截取再平滑）。
+    预测是确定性的：随机量由 seed（默认由输入指纹得到）按天生成，同样的输入得到同样的结果，
+    轨迹缓存在 forecast_cache 中，天数变化时截取或续算
+    """
+    profile = profile or session_profile()
 
     # 尝试加载模型
     if model is None or scalers is None:
@@ -311,7 +617,7 @@ def predict_future_lstm(df: pd.DataFrame, model=None, scalers=None, days: int =
     if model is None or scalers is None:
         st.warning("模型未找到，正在重新训练模型...")
         # 自动训练新的模型
-        train_result = train_lstm(df, training_plan, diet_plan)
+        train_result = train_lstm(df, training_plan, diet_plan, profile)
         if train_result.get("status") == "error":
             st.error(f"模型训练失败: {train_result.get('message')}")
             return {"status": "error", "message": "无法进行预测，请稍后再试。"}
@@ -323,81 +629,77 @@ def predict_future_lstm(df: pd.DataFrame, model=None, scalers=None, days: int =
             return {"status": "error", "message": "无法加载新模型"}
 
     # 进行体重预测
-    data = build_training_frame(df, training_plan, diet_plan)
+    data = build_training_frame(df, training_plan, diet_plan, profile)
     if data.empty:
         return {"status": "error", "message": "没有数据，无法预测。"}
     if len(data) < seq_len:
         return {"status": "error", "message": f"数据不足，至少需要 {seq_len} 条记录进行预测。"}
 
-    scaler_x, scaler_y = scalers
     last_weight = float(data.iloc[-1]['weight'])
     last_height = data.iloc[-1]['height']
     last_date = data['date'].max()
 
-    features = data[['day_of_week', 'planned_exercise', 'planned_calorie_intake']].fillna(0).values
-    features_scaled = scaler_x.transform(features)
-    last_seq = features_scaled[-seq_len:].copy()
+    # 未来每天的特征只取决于日期和计划，与预测出的体重无关，可以一次性算好
+    pred_dates = [last_date + pd.Timedelta(days=i + 1) for i in range(days)]
+    planned = Plan.planned_features(pred_dates, training_plan, diet_plan)
+    future_features = future_feature_matrix(pred_dates, planned[:, 0], planned[:, 1])
+
+    key = forecast_cache.forecast_key(
+        inputs=feature_cache.feature_key(df, training_plan, diet_plan, profile),
+        model=model_version(model, scalers), method="lstm", samples=samples, seq_len=seq_len, seed=seed)
+    seed = forecast_ensemble.forecast_seed(key) if seed is None else seed
+
+    def rollout(start, last_weights, end):
+        # 计算第start天到第end天的轨迹；窗口会用到之前的特征，所以特征从第0天起重新生成（确定性的，与之前一致）
+        dates = [last_date + pd.Timedelta(days=i + 1) for i in range(end)]
+        plan = Plan.planned_features(dates, training_plan, diet_plan)
+        draws = forecast_ensemble.draw_daily(seed, end, samples)
+        if samples > 0:
+            # 蒙特卡洛：每条轨迹的计划执行情况不同，形状 (samples, days, n_features)
+            sampled = future_feature_matrix(dates, *forecast_ensemble.sample_adherence(plan[:, 0], plan[:, 1], draws))
+        else:
+            sampled = future_feature_matrix(dates, plan[:, 0], plan[:, 1])[np.newaxis]
+        return lstm_trajectories(data, model, scalers, sampled, seq_len, draws['fluctuation'][:, start:],
+                                 start, last_weights)
 
-    preds = []
-    current_weight = last_weight
-    user_age = st.session_state.user_age
-    user_sex = st.session_state.user_sex
-
-    # 清除任何现有的Keras会话，避免名称作用域冲突
-    import tensorflow as tf
-    tf.keras.backend.clear_session()
-
-    for i in range(days):
-        pred_date = last_date + pd.Timedelta(days=i + 1)
-        day_of_week = pred_date.dayofweek
-        planned_exercise = Plan.get_planned_exercise(pred_date, training_plan) if training_plan is not None else 0
-        planned_calories = Plan.get_planned_calories(pred_date, diet_plan) if diet_plan is not None else 0
-
-        # 确保序列形状正确
-        if last_seq.shape[0] != seq_len:
-            st.error(f"序列长度不正确: 期望 {seq_len}, 实际 {last_seq.shape[0]}")
-            return {"status": "error", "message": "序列长度错误"}
-
-        # 预测 Δweight
-        try:
-            delta_scaled = model.predict(last_seq.reshape(1, seq_len, -1), verbose=0)
-            delta_weight = float(scaler_y.inverse_transform(delta_scaled)[0][0])
-        except Exception as e:
-            st.error(f"预测错误: {str(e)}")
-            return {"status": "error", "message": f"预测失败: {str(e)}"}
-
-        # 更新体重
-        pred_weight = current_weight + delta_weight
-        pred_weight = apply_reasonable_constraints(pred_weight, current_weight, data['weight'].values)
-
-        pred_bmi = bmi_calculation.calculate_bmi(pred_weight, last_height)
-        basal_metabolism = bmi_calculation.calculate_bmr(pred_weight, last_height, user_age, user_sex)
-        total_calorie_burn = basal_metabolism + planned_exercise
-        planned_gap = planned_calories - total_calorie_burn
-
-        # 更新序列（新的一天特征）
-        new_features = np.array([[day_of_week, planned_exercise, planned_calories]])
-        new_features_scaled = scaler_x.transform(new_features)
-        last_seq = np.vstack([last_seq[1:], new_features_scaled])
+    try:
+        trajectories = forecast_cache.cache.get(key, days, rollout)
+    except Exception as e:
+        st.error(f"预测错误: {str(e)}")
+        return {"status": "error", "message": f"预测失败: {str(e)}"}
+
+    user_age = profile['user_age']
+    user_sex = profile['user_sex']
+
+    bands = None
+    if samples > 0:
+        bands = forecast_ensemble.quantile_bands(trajectories)
+        pred_weights = np.median(trajectories, axis=0)
+    else:
+        pred_weights = trajectories[0]
 
+    # BMI和基础代谢对整个预测期一次算完
+    pred_bmis = bmi_calculation.calculate_bmi_array(pred_weights, last_height)
+    basal_metabolisms = bmi_calculation.calculate_bmr_array(pred_weights, last_height, user_age, user_sex)
+    total_calorie_burns = basal_metabolisms + future_features[:, 1]
+
+    preds = []
+    for i, pred_date in enumerate(pred_dates):
         preds.append({
             "date": pred_date,
-            "weight": round(pred_weight, 2),
-            "bmi": round(pred_bmi, 2),
-            "planned_exercise": round(planned_exercise, 1),
-            "planned_calories": round(planned_calories, 1),
-            "total_calorie_burn": round(total_calorie_burn, 1),
-            "basal_metabolism": round(basal_metabolism, 1)
+            "weight": round(float(pred_weights[i]), 2),
+            "bmi": round(float(pred_bmis[i]), 2),
+            "planned_exercise": round(float(future_features[i, 1]), 1),
+            "planned_calories": round(float(future_features[i, 2]), 1),
+            "total_calorie_burn": round(float(total_calorie_burns[i]), 1),
+            "basal_metabolism": round(float(basal_metabolisms[i]), 1)
         })
 
-        current_weight = pred_weight
-
-    # 平滑一下曲线
-    preds_df = pd.DataFrame(preds)
-    preds_df['weight'] = preds_df['weight'].rolling(window=3, min_periods=1, center=True).mean()
-    preds = preds_df.to_dict(orient="records")
+    # 平滑一下曲线（多条轨迹的中位数本身已经平滑）
+    if bands is None and smooth:
+        preds = smooth_predictions(preds)
 
-    return {
+    result = {
         "status": "success",
         "predictions": preds,
         "start_date": preds[0]['date'] if preds else None,
@@ -407,3 +709,7 @@ def predict_future_lstm(df: pd.DataFrame, model=None, scalers=None, days: int =
         "weight_change": round(preds[-1]['weight'] - last_weight, 1) if preds else None,
 
     }
+    if bands is not None:
+        result["samples"] = samples
+        result["bands"] = bands
+    return result
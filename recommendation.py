@@ -17,6 +17,25 @@ def export_report(data, target_weight=None):
             st.info("暂无数据")
             return
 
+        # 整段历史一次计算BMI并分级
+        height = data['height'] if 'height' in data.columns else pd.Series(index=data.index, dtype=float)
+        height = height.fillna(st.session_state.get('user_height', 170.0))
+        bmi = bmi_calculation.calculate_bmi_array(data['weight'], height)
+        codes = bmi_calculation.classify_bmi(bmi)
+        report = pd.DataFrame({
+            '日期': pd.to_datetime(data['date']).dt.strftime('%Y-%m-%d').values,
+            '体重(kg)': data['weight'].values,
+            'BMI': bmi,
+            '体重状态': bmi_calculation.bmi_category_labels(codes),
+        })
+
+        st.subheader(f"📄 最近{len(report)}条记录健康报告")
+        counts = report['体重状态'].value_counts(sort=False)
+        cols = st.columns(len(counts))
+        for col, (cat, count) in zip(cols, counts.items()):
+            col.metric(cat, f"{count} 天")
+        st.dataframe(report, use_container_width=True, hide_index=True)
+        st.info(bmi_calculation.bmi_advice(codes[-1]))
 
     elif isinstance(data, dict) and data.get('status') == 'success':
         if target_weight is not None:
@@ -94,11 +113,8 @@ def generate_recommendation(pred, target_weight):
     # 使用科学BMR计算TDEE
     current_bmr = bmi_calculation.calculate_bmr(start_weight, user_height, user_age, user_sex)
 
-    activity_levels = {
-        "久坐": 1.2, "轻度活动": 1.375, "中度活动": 1.55,
-        "高强度活动": 1.725, "非常活跃": 1.9
-    }
-    activity_factor = activity_levels.get(st.session_state.user_activity_level, 1.375)
+    activity_factor = DATA.ACTIVITY_LEVELS.get(st.session_state.user_activity_level,
+                                               DATA.ACTIVITY_LEVELS[DATA.DEFAULT_ACTIVITY_LEVEL])
     tdee = current_bmr * activity_factor
 
     st.info(f"🔥 您的每日总能量消耗约为: {tdee:.0f} kcal")
@@ -109,9 +125,9 @@ def generate_recommendation(pred, target_weight):
         # 健康减重建议
         days_to_goal = len(preds_df)
         healthy_weekly_loss = 0.5  # 每周健康减重0.5kg
-        healthy_daily_deficit = (healthy_weekly_loss * 7700) / 7  # 约550 kcal/天
+        healthy_daily_deficit = (healthy_weekly_loss * DATA.KCAL_PER_KG) / 7  # 约550 kcal/天
 
-        total_deficit_needed = target_diff * 7700
+        total_deficit_needed = target_diff * DATA.KCAL_PER_KG
         actual_daily_deficit = total_deficit_needed / days_to_goal
 
         # 判断减重速度是否合理
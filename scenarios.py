@@ -0,0 +1,126 @@
+#方案对比：一次批量计算多组饮食/运动计划组合的体重预测
+
+import numpy as np
+import pandas as pd
+import DATA
+import Plan
+import energy_balance
+import models
+
+# 当前饮食计划在对比表中的名称
+CURRENT_DIET = "当前饮食计划"
+
+
+def exercise_variant(training_plan, minutes):
+    """把锻炼计划每天的运动时长统一改为 minutes；没有锻炼计划时每天做默认运动"""
+    if training_plan is None or training_plan.empty:
+        return pd.DataFrame({
+            'exercise_type': [DATA.SCENARIO_DEFAULT_EXERCISE] * 7,
+            'exercise_time': [float(minutes)] * 7,
+            'days_per_week': [7] * 7,
+        })
+    plan = training_plan.copy()
+    plan['exercise_time'] = float(minutes)
+    return plan
+
+
+def scenario_grid(diet_plans: dict, exercise_minutes, training_plan=None):
+    """饮食计划 × 运动时长的全部组合，diet_plans 为 {名称: 饮食计划DataFrame}"""
+    return [{
+        'diet': name,
+        'exercise_minutes': minutes,
+        'training_plan': exercise_variant(training_plan, minutes),
+        'diet_plan': diet_plan,
+    } for name, diet_plan in diet_plans.items() for minutes in exercise_minutes]
+
+
+def default_diet_plans(diet_plan=None):
+    """当前饮食计划（如果有）加上全部预设减脂餐"""
+    plans = {}
+    if diet_plan is not None and not diet_plan.empty:
+        plans[CURRENT_DIET] = diet_plan
+    for name in DATA.PRESET_DIET_PLANS:
+        plans[name] = Plan.preset_diet_plan(name)
+    return plans
+
+
+def days_to_target(weights, start_weight, target_weight):
+    """
+    每条轨迹第一次到达目标体重是第几天（从1开始），预测期内达不到时为NaN。
+    weights 形状 (scenarios, days)
+    """
+    weights = np.asarray(weights, dtype=float)
+    if target_weight is None:
+        return np.full(weights.shape[0], np.nan)
+    reached = weights <= target_weight if target_weight <= start_weight else weights >= target_weight
+    return np.where(reached.any(axis=1), reached.argmax(axis=1) + 1.0, np.nan)
+
+
+def within_training_range(scaler_x, features, tolerance=None):
+    """方案的输入特征是否落在模型训练数据的范围内（超出时LSTM只会外推，结果不可信）"""
+    tolerance = DATA.WARM_START_RANGE_TOLERANCE if tolerance is None else tolerance
+    features = np.asarray(features, dtype=float)
+    scaled = scaler_x.transform(features.reshape(-1, features.shape[-1]))
+    return bool(np.all((scaled >= -tolerance) & (scaled <= 1 + tolerance)))
+
+
+def run_scenarios(df: pd.DataFrame, scenarios, days: int = 28, target_weight=None,
+                  training_plan=None, diet_plan=None, model=None, scalers=None,
+                  profile: dict = None, activity_level: str = None, seq_len: int = 7):
+    """
+    对所有方案一次批量预测。有LSTM模型且方案都在模型训练数据范围内时用模型
+    （所有方案的窗口合并成一个batch），否则用能量平衡模型（所有方案同时逐日模拟）。
+    training_plan/diet_plan 是用户当前的计划，只用于构建LSTM的历史输入。
+    返回 {"status": "success", "method": ..., "note": 未用LSTM的原因, "table": 对比表DataFrame,
+    "weights": (scenarios, days)}
+    """
+    profile = profile or models.session_profile()
+    if not scenarios:
+        return {"status": "error", "message": "没有可对比的方案。"}
+    if df is None or df.empty or df['weight'].dropna().empty:
+        return {"status": "error", "message": "没有体重数据，无法预测。"}
+
+    data = df.dropna(subset=['weight']).sort_values('date')
+    last = data.iloc[-1]
+    start_weight = float(last['weight'])
+    pred_dates = pd.date_range(last['date'] + pd.Timedelta(days=1), periods=days, freq='D')
+
+    # 每个方案的每日运动消耗和摄入，形状 (scenarios, days)
+    planned = np.stack([Plan.planned_features(pred_dates, s['training_plan'], s['diet_plan'])
+                        for s in scenarios])
+    exercise = np.nan_to_num(planned[:, :, 0])
+    intake = planned[:, :, 1]
+
+    method = "energy_balance"
+    note = None
+    if model is not None and scalers is not None:
+        frame = models.build_training_frame(df, training_plan, diet_plan, profile)
+        features = models.future_feature_matrix(pred_dates, exercise, intake)
+        if len(frame) < seq_len:
+            note = f"数据不足{seq_len}条，LSTM模型无法预测"
+        elif not within_training_range(scalers[0], features):
+            note = "部分方案超出LSTM模型训练数据的范围"
+        else:
+            method = "lstm"
+            try:
+                weights = models.lstm_trajectories(frame, model, scalers, features, seq_len)
+            except Exception as e:
+                return {"status": "error", "message": f"预测失败: {str(e)}"}
+
+    if method == "energy_balance":
+        intake = np.stack([energy_balance.daily_intake(data, row) for row in intake])
+        height = last['height'] if 'height' in data.columns and pd.notna(last['height']) else profile['user_height']
+        weights, _ = energy_balance.simulate(start_weight, height, profile['user_age'], profile['user_sex'],
+                                             energy_balance.activity_factor(activity_level), intake, exercise)
+
+    end_weights = weights[:, -1]
+    table = pd.DataFrame({
+        '饮食计划': [s['diet'] for s in scenarios],
+        '运动(分钟/天)': [s['exercise_minutes'] for s in scenarios],
+        '日均摄入(kcal)': intake.mean(axis=1).round(0),
+        '日均运动消耗(kcal)': exercise.mean(axis=1).round(0),
+        f'{days}天后体重(kg)': end_weights.round(2),
+        '每周变化(kg)': ((end_weights - start_weight) / days * 7).round(2),
+        '达到目标(天)': days_to_target(weights, start_weight, target_weight),
+    })
+    return {"status": "success", "method": method, "note": note, "table": table, "weights": weights}
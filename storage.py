@@ -0,0 +1,332 @@
+#健康数据存储后端
+
+import argparse
+import contextlib
+import json
+import os
+import sqlite3
+import numpy as np
+import pandas as pd
+import DATA
+import health_log
+
+
+def recent_rows(df, days):
+    """最近days天（以最后一条记录为准）的记录，按日期排序"""
+    if df is None or df.empty:
+        return df
+    end_date = df['date'].max()
+    start_date = end_date - pd.Timedelta(days=days)
+    return df[(df['date'] >= start_date) & (df['date'] <= end_date)].sort_values('date')
+
+
+def tail_rows(df, n):
+    """按日期排序后的最后n条记录"""
+    if df is None or df.empty:
+        return df
+    return df.sort_values('date').tail(n)
+
+
+class BaseStore:
+    """存储后端基类：范围查询默认读取全部数据后在内存中过滤"""
+    name = None
+    # 是否支持只读取所需行的索引查询
+    indexed = False
+
+    def load_recent(self, username, days):
+        return recent_rows(self.load(username), days)
+
+    def load_tail(self, username, n):
+        return tail_rows(self.load(username), n)
+
+
+class CsvStore(BaseStore):
+    """CSV快照 + 追加日志（默认后端）"""
+    name = "csv"
+
+    def exists(self, username):
+        path = DATA.get_data_file(username)
+        return os.path.exists(path) or os.path.exists(health_log.get_log_file(path))
+
+    def load(self, username):
+        df = health_log.read_records(DATA.get_data_file(username))
+        if 'date' in df.columns:
+            df['date'] = pd.to_datetime(df['date'], errors='coerce', format='mixed')
+            df = df.dropna(subset=['date'])
+        return df
+
+    def save(self, username, df):
+        health_log.write_snapshot(df, DATA.get_data_file(username))
+
+    def append(self, username, records):
+        health_log.append_records(records, DATA.get_data_file(username))
+
+
+class ColumnarStore(BaseStore):
+    """
+    列式存储：每列一个定长二进制文件，读取时直接内存映射，无需文本解析。
+    运动类型以int16编码保存，编码表见exercise_types.json（-1表示缺失）。
+    只保存标准的六列健康数据。
+    """
+    name = "columnar"
+
+    # 列名 -> (文件名, 数据类型)
+    COLUMNS = {
+        'date': ("date.i8", np.int64),
+        'weight': ("weight.f8", np.float64),
+        'height': ("height.f8", np.float64),
+        'exercise_type': ("exercise_code.i2", np.int16),
+        'exercise_time': ("exercise_time.f8", np.float64),
+        'calorie_intake': ("calorie_intake.f8", np.float64),
+    }
+    VOCAB_FILE = "exercise_types.json"
+
+    def _dir(self, username):
+        return DATA.get_columnar_dir(username)
+
+    def exists(self, username):
+        return os.path.exists(os.path.join(self._dir(username), self.COLUMNS['date'][0]))
+
+    def _read_vocab(self, username):
+        path = os.path.join(self._dir(username), self.VOCAB_FILE)
+        if not os.path.exists(path):
+            return list(DATA.EXERCISE_Kkcal.keys())
+        with open(path, encoding="utf-8") as f:
+            return json.load(f)
+
+    def _write_vocab(self, username, vocab):
+        path = os.path.join(self._dir(username), self.VOCAB_FILE)
+        with open(path + ".tmp", "w", encoding="utf-8") as f:
+            json.dump(vocab, f, ensure_ascii=False)
+        os.replace(path + ".tmp", path)
+
+    def _map_column(self, username, col):
+        filename, dtype = self.COLUMNS[col]
+        path = os.path.join(self._dir(username), filename)
+        if not os.path.exists(path) or os.path.getsize(path) == 0:
+            return np.empty(0, dtype=dtype)
+        return np.memmap(path, dtype=dtype, mode='r')
+
+    def load_arrays(self, username):
+        """以内存映射数组的形式打开所有列（不复制、不解析）"""
+        arrays = {col: self._map_column(username, col) for col in self.COLUMNS}
+        # 追加中途中断时各列长度可能不一致，以最短的列为准
+        n = min(len(a) for a in arrays.values())
+        return {col: a[:n] for col, a in arrays.items()}
+
+    def load(self, username):
+        if not self.exists(username):
+            return health_log.empty_frame()
+        arrays = self.load_arrays(username)
+        vocab = np.array(self._read_vocab(username) + [np.nan], dtype=object)
+
+        df = pd.DataFrame({
+            'date': arrays['date'].view('datetime64[ns]'),
+            'weight': arrays['weight'],
+            'height': arrays['height'],
+            # -1 指向末尾的NaN
+            'exercise_type': vocab[arrays['exercise_type']],
+            'exercise_time': arrays['exercise_time'],
+            'calorie_intake': arrays['calorie_intake'],
+        })
+        df = df[df['date'].notna()]
+        if not df['date'].is_monotonic_increasing or df['date'].duplicated().any():
+            # 与追加日志相同的语义：同一日期以最后写入的记录为准
+            df = df.sort_values('date', kind='mergesort').drop_duplicates('date', keep='last')
+        return df.reset_index(drop=True)
+
+    def _encode(self, username, df):
+        """把DataFrame转换为各列的定长数组"""
+        df = df.reindex(columns=health_log.HEALTH_COLUMNS)
+        dates = pd.to_datetime(df['date'], errors='coerce', format='mixed')
+        df = df[dates.notna()]
+        dates = dates[dates.notna()]
+
+        vocab = self._read_vocab(username)
+        codes = np.full(len(df), -1, dtype=np.int16)
+        for i, value in enumerate(df['exercise_type'].tolist()):
+            if pd.isna(value):
+                continue
+            if value not in vocab:
+                vocab.append(value)
+            codes[i] = vocab.index(value)
+
+        arrays = {
+            'date': dates.values.astype('datetime64[ns]').view(np.int64),
+            'exercise_type': codes,
+        }
+        for col in ('weight', 'height', 'exercise_time', 'calorie_intake'):
+            arrays[col] = pd.to_numeric(df[col], errors='coerce').to_numpy(dtype=np.float64)
+        return arrays, vocab
+
+    def save(self, username, df):
+        os.makedirs(self._dir(username), exist_ok=True)
+        arrays, vocab = self._encode(username, df)
+        self._write_vocab(username, vocab)
+        for col, (filename, dtype) in self.COLUMNS.items():
+            path = os.path.join(self._dir(username), filename)
+            arrays[col].astype(dtype).tofile(path + ".tmp")
+            os.replace(path + ".tmp", path)
+
+    def append(self, username, records):
+        if records is None or len(records) == 0:
+            return
+        os.makedirs(self._dir(username), exist_ok=True)
+        arrays, vocab = self._encode(username, records)
+        self._write_vocab(username, vocab)
+        for col, (filename, dtype) in self.COLUMNS.items():
+            with open(os.path.join(self._dir(username), filename), "ab") as f:
+                f.write(arrays[col].astype(dtype).tobytes())
+
+
+class SqliteStore(BaseStore):
+    """
+    所有用户共用一个SQLite数据库，主键(username, date)即索引，
+    最近N天/最后N条等查询只读取需要的行；写入在事务中完成，支持多会话并发。
+    """
+    name = "sqlite"
+    indexed = True
+
+    DATE_FORMAT = '%Y-%m-%d %H:%M:%S'
+    VALUE_COLUMNS = ['weight', 'height', 'exercise_type', 'exercise_time', 'calorie_intake']
+
+    def __init__(self, path=None):
+        self.path = path or DATA.get_database_file()
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS health_records (
+                    username TEXT NOT NULL,
+                    date TEXT NOT NULL,
+                    weight REAL,
+                    height REAL,
+                    exercise_type TEXT,
+                    exercise_time REAL,
+                    calorie_intake REAL,
+                    PRIMARY KEY (username, date)
+                ) WITHOUT ROWID
+            """)
+
+    @contextlib.contextmanager
+    def _connect(self):
+        # 每次操作使用独立连接，避免跨线程共享；事务结束后关闭连接（sqlite3的with只提交/回滚，不会关闭）
+        conn = sqlite3.connect(self.path, timeout=30)
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    def _query(self, sql, params):
+        with self._connect() as conn:
+            df = pd.read_sql_query(sql, conn, params=params)
+        df['date'] = pd.to_datetime(df['date'], format=self.DATE_FORMAT)
+        return df.reset_index(drop=True)
+
+    def _rows(self, username, df):
+        df = df.reindex(columns=health_log.HEALTH_COLUMNS)
+        dates = pd.to_datetime(df['date'], errors='coerce', format='mixed')
+        valid = dates.notna()
+        values = df.loc[valid, self.VALUE_COLUMNS].astype(object)
+        values = values.where(values.notna(), None)
+        date_strs = dates[valid].dt.strftime(self.DATE_FORMAT)
+        return [(username, d, *row) for d, row in
+                zip(date_strs, values.itertuples(index=False, name=None))]
+
+    def exists(self, username):
+        with self._connect() as conn:
+            row = conn.execute("SELECT 1 FROM health_records WHERE username = ? LIMIT 1",
+                               (username,)).fetchone()
+        return row is not None
+
+    def load(self, username):
+        return self._query("SELECT date, weight, height, exercise_type, exercise_time, calorie_intake "
+                           "FROM health_records WHERE username = ? ORDER BY date", (username,))
+
+    def load_recent(self, username, days):
+        with self._connect() as conn:
+            row = conn.execute("SELECT MAX(date) FROM health_records WHERE username = ?",
+                               (username,)).fetchone()
+        if row is None or row[0] is None:
+            return self.load(username)
+        start = (pd.Timestamp(row[0]) - pd.Timedelta(days=days)).strftime(self.DATE_FORMAT)
+        return self._query("SELECT date, weight, height, exercise_type, exercise_time, calorie_intake "
+                           "FROM health_records WHERE username = ? AND date >= ? ORDER BY date",
+                           (username, start))
+
+    def load_tail(self, username, n):
+        df = self._query("SELECT date, weight, height, exercise_type, exercise_time, calorie_intake "
+                         "FROM health_records WHERE username = ? ORDER BY date DESC LIMIT ?",
+                         (username, int(n)))
+        return df.iloc[::-1].reset_index(drop=True)
+
+    def save(self, username, df):
+        rows = self._rows(username, df)
+        with self._connect() as conn:
+            conn.execute("DELETE FROM health_records WHERE username = ?", (username,))
+            conn.executemany("INSERT OR REPLACE INTO health_records VALUES (?, ?, ?, ?, ?, ?, ?)", rows)
+
+    def append(self, username, records):
+        if records is None or len(records) == 0:
+            return
+        rows = self._rows(username, records)
+        with self._connect() as conn:
+            conn.executemany("INSERT OR REPLACE INTO health_records VALUES (?, ?, ?, ?, ?, ?, ?)", rows)
+
+
+STORES = {
+    CsvStore.name: CsvStore,
+    ColumnarStore.name: ColumnarStore,
+    SqliteStore.name: SqliteStore,
+}
+
+_store_instances = {}
+
+
+def get_store(name=None):
+    """获取存储后端，默认使用部署配置 DATA.STORAGE_BACKEND"""
+    name = name or DATA.STORAGE_BACKEND
+    if name not in STORES:
+        raise ValueError(f"未知的存储后端: {name}，可选: {', '.join(STORES)}")
+    if name not in _store_instances:
+        _store_instances[name] = STORES[name]()
+    return _store_instances[name]
+
+
+def list_users():
+    """用户目录下的所有用户（每个用户一个子目录）"""
+    if not os.path.isdir(DATA.USER_DATA_DIR):
+        return []
+    return sorted(d for d in os.listdir(DATA.USER_DATA_DIR)
+                  if os.path.isdir(os.path.join(DATA.USER_DATA_DIR, d)))
+
+
+def migrate(source, target, usernames=None):
+    """把用户健康数据从一个后端迁移到另一个后端，返回迁移的用户数"""
+    src, dst = get_store(source), get_store(target)
+    count = 0
+    for username in usernames or list_users():
+        if not src.exists(username):
+            continue
+        dst.save(username, src.load(username))
+        count += 1
+    return count
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="健康数据存储后端工具")
+    sub = parser.add_subparsers(dest="command", required=True)
+    p_migrate = sub.add_parser("migrate", help="在存储后端之间迁移已有数据")
+    p_migrate.add_argument("--from", dest="source", default=CsvStore.name, choices=list(STORES))
+    p_migrate.add_argument("--to", dest="target", required=True, choices=list(STORES))
+    p_migrate.add_argument("--users", nargs="*", help="只迁移指定用户（默认全部）")
+    args = parser.parse_args(argv)
+
+    if args.command == "migrate":
+        count = migrate(args.source, args.target, args.users)
+        print(f"已迁移 {count} 个用户: {args.source} -> {args.target}")
+        print(f"请设置环境变量 BMI_STORAGE_BACKEND={args.target} 以启用新后端")
+
+
+if __name__ == "__main__":
+    main()
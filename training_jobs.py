@@ -0,0 +1,110 @@
+#后台训练队列：训练请求入队执行，页面轮询进度，不阻塞用户会话
+
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+import DATA
+
+QUEUED = "queued"
+RUNNING = "running"
+SUCCESS = "success"
+ERROR = "error"
+# 仍在排队或训练中的状态，同一用户处于这些状态时不重复入队
+ACTIVE_STATES = (QUEUED, RUNNING)
+
+
+class TrainingQueue:
+    """
+    固定大小的训练线程池 + 按用户名索引的任务表。
+    同一用户已有未完成的任务时，新的请求直接返回该任务。
+    """
+
+    def __init__(self, max_workers=None):
+        self.max_workers = DATA.TRAINING_WORKERS if max_workers is None else max_workers
+        self._executor = None
+        self._jobs = {}
+        self._lock = threading.Lock()
+
+    def _get_executor(self):
+        # 第一次提交任务时才创建线程池
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=self.max_workers,
+                                                thread_name_prefix="bmi-train")
+        return self._executor
+
+    def submit(self, username, df, training_plan, diet_plan, profile):
+        """提交训练任务，返回任务信息（字典副本）"""
+        with self._lock:
+            job = self._jobs.get(username)
+            if job is not None and job['status'] in ACTIVE_STATES:
+                return dict(job)
+            job = {
+                'username': username,
+                'status': QUEUED,
+                'submitted_at': time.time(),
+                'started_at': None,
+                'finished_at': None,
+                'epoch': 0,
+                'epochs': None,
+                'message': None,
+            }
+            self._jobs[username] = job
+            # 任务使用提交时的数据快照，会话中的数据之后再变化也不影响
+            args = (
+                df.copy(),
+                training_plan.copy() if training_plan is not None else None,
+                diet_plan.copy() if diet_plan is not None else None,
+                dict(profile),
+            )
+            self._get_executor().submit(self._run, job, *args)
+            return dict(job)
+
+    def _run(self, job, df, training_plan, diet_plan, profile):
+        import models
+
+        def progress(epoch, epochs):
+            with self._lock:
+                job['epoch'], job['epochs'] = epoch, epochs
+
+        with self._lock:
+            job['status'] = RUNNING
+            job['started_at'] = time.time()
+        try:
+            result = models.train_lstm(df, training_plan, diet_plan, profile,
+                                       username=job['username'], progress=progress)
+            status = SUCCESS if result.get("status") == "success" else ERROR
+            message = result.get("message")
+        except Exception as e:
+            status, message = ERROR, f"训练失败: {str(e)}"
+        with self._lock:
+            job['status'] = status
+            job['message'] = message
+            job['finished_at'] = time.time()
+
+    def status(self, username):
+        """用户最近一次训练任务的信息，没有任务时返回None"""
+        with self._lock:
+            job = self._jobs.get(username)
+            if job is None:
+                return None
+            info = dict(job)
+            if job['status'] == QUEUED:
+                # 排在前面的任务数
+                info['position'] = sum(1 for other in self._jobs.values()
+                                       if other['status'] == QUEUED and other['submitted_at'] < job['submitted_at'])
+            return info
+
+    def is_active(self, username):
+        job = self.status(username)
+        return job is not None and job['status'] in ACTIVE_STATES
+
+    def stats(self):
+        with self._lock:
+            counts = {state: 0 for state in (QUEUED, RUNNING, SUCCESS, ERROR)}
+            for job in self._jobs.values():
+                counts[job['status']] += 1
+            return {'max_workers': self.max_workers, **counts}
+
+
+# 进程级共享的训练队列
+queue = TrainingQueue()
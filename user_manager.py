@@ -3,21 +3,94 @@ import pandas as pd
 import os
 import streamlit as st
 import DATA
+import fingerprint
+import health_log
+import storage
+
+# 用户配置中的基本信息及默认值
+PROFILE_DEFAULTS = {
+    'user_height': 170.0,
+    'user_sex': "男",
+    'user_age': 30,
+    'user_activity_level': "轻度活动",
+    'target_weight': None,
+    'target_baseline_weight': None,
+    'target_set_date': None,
+}
+
+# 独立跟踪变化的持久化单元：config/训练计划/饮食计划写入user_config.pkl，df写入health_data.csv
+CONFIG_PARTS = ('config', 'training_plan', 'diet_plan')
+
+# 保存状态（指纹、逐行哈希）在session_state中的键：user_manager是所有会话共用的单例，状态必须按会话保存
+SAVE_STATE_KEY = '_user_manager_save_state'
+
+
+def read_user_config(username):
+    """读取用户配置（基本信息、训练计划、饮食计划），不存在时返回空字典"""
+    config_file = DATA.get_user_config_file(username)
+    if not os.path.exists(config_file):
+        return {}
+    with open(config_file, 'rb') as f:
+        return pickle.load(f)
+
+
+def read_user_inputs(username):
+    """读取用户的健康数据、训练计划、饮食计划和配置（离线任务用，不依赖会话）"""
+    config = read_user_config(username)
+    store = storage.get_store()
+    df = store.load(username) if store.exists(username) else None
+    return df, config.get('user_training_plan'), config.get('diet_plan'), config
+
+
+def _new_save_state():
+    return {
+        # 每个持久化单元最近一次落盘时的指纹
+        'saved_fingerprints': {},
+        # df指纹缓存：(对象, 指纹, 逐行哈希)，同一对象不重复哈希
+        'df_fingerprint_cache': (None, None, None),
+        # 最近一次落盘的df逐行哈希和日期，用于判断能否只追加日志
+        'saved_rows': (None, None),
+    }
+
+
+def _save_state_property(name):
+    """读写当前会话保存状态中的一项"""
+    def getter(self):
+        return self._save_state()[name]
+
+    def setter(self, value):
+        self._save_state()[name] = value
+    return property(getter, setter)
 
 
 class UserManager:
-    def __init__(self):
-        self.current_user = None
+    """
+    用户登录和数据保存。实例是所有会话共用的单例，不保存任何会话状态：
+    当前用户和保存状态都放在各自会话的session_state中
+    """
+    _saved_fingerprints = _save_state_property('saved_fingerprints')
+    _df_fingerprint_cache = _save_state_property('df_fingerprint_cache')
+    _saved_rows = _save_state_property('saved_rows')
+
+    @property
+    def current_user(self):
+        return st.session_state.get('current_user')
+
+    def _save_state(self):
+        if SAVE_STATE_KEY not in st.session_state:
+            st.session_state[SAVE_STATE_KEY] = _new_save_state()
+        return st.session_state[SAVE_STATE_KEY]
 
     def login(self, username):
         """用户登录"""
-        self.current_user = username
         st.session_state.current_user = username
+        st.session_state[SAVE_STATE_KEY] = _new_save_state()
         self.load_user_data()
 
     def logout(self):
         """用户登出"""
-        self.current_user = None
+        self.save_user_data()
+        st.session_state[SAVE_STATE_KEY] = _new_save_state()
         st.session_state.current_user = None
         st.session_state.user_initialized = False
 
@@ -37,66 +110,124 @@ class UserManager:
             pickle.dump(user_config, f)
 
         # 创建空的数据文件
-        empty_df = pd.DataFrame(columns=[
-            'date', 'weight', 'height', 'exercise_type',
-            'exercise_time', 'calorie_intake'
-        ])
-        empty_df.to_csv(DATA.get_data_file(username), index=False)
+        storage.get_store().save(username, health_log.empty_frame())
 
     def load_user_data(self):
         """加载用户数据到session_state"""
         if not self.current_user:
             return
 
-        # 加载用户配置
-        config_file = DATA.get_user_config_file(self.current_user)
-        if os.path.exists(config_file):
-            with open(config_file, 'rb') as f:
-                user_config = pickle.load(f)
-
-            # 设置session_state
-            for key, value in user_config.items():
-                st.session_state[key] = value
+        # 加载用户配置，设置session_state
+        for key, value in read_user_config(self.current_user).items():
+            st.session_state[key] = value
 
         # 加载健康数据
-        data_file = DATA.get_data_file(self.current_user)
-        if os.path.exists(data_file):
-            st.session_state.df = pd.read_csv(data_file)
-            st.session_state.df['date'] = pd.to_datetime(st.session_state.df['date'])
+        store = storage.get_store()
+        if store.exists(self.current_user):
+            st.session_state.df = store.load(self.current_user)
         else:
-            st.session_state.df = pd.DataFrame(columns=[
-                'date', 'weight', 'height', 'exercise_type',
-                'exercise_time', 'calorie_intake'
-            ])
+            st.session_state.df = health_log.empty_frame()
+
+        # 刚加载的数据与磁盘一致，记录为已保存状态
+        self._saved_fingerprints = self._fingerprint_parts()
+        self._remember_saved_rows(st.session_state.df)
 
         # 初始化其他用户特定的session_state
         st.session_state.user_initialized = True
 
-    def save_user_data(self):
-        """保存用户数据"""
+    def _collect_parts(self):
+        """按持久化单元收集当前会话数据"""
+        return {
+            'config': {key: st.session_state.get(key, default) for key, default in PROFILE_DEFAULTS.items()},
+            'training_plan': st.session_state.get('user_training_plan', None),
+            'diet_plan': st.session_state.get('diet_plan', pd.DataFrame()),
+            'df': st.session_state.get('df', None),
+        }
+
+    def _df_fingerprint(self, df):
+        """
+        df指纹，同一对象只计算一次。session_state.df 应整体替换而不是原地修改；
+        原地修改后必须调用 mark_dirty('df')，否则修改不会被保存
+        """
+        cached_df, cached_fp, _ = self._df_fingerprint_cache
+        if df is not None and df is cached_df:
+            return cached_fp
+        hashes = fingerprint.row_hashes(df)
+        fp = fingerprint.frame_fingerprint(df, hashes)
+        self._df_fingerprint_cache = (df, fp, hashes)
+        return fp
+
+    def _df_row_hashes(self, df):
+        self._df_fingerprint(df)
+        return self._df_fingerprint_cache[2]
+
+    def _remember_saved_rows(self, df):
+        if df is None or 'date' not in df.columns:
+            self._saved_rows = (None, None)
+        else:
+            self._saved_rows = (self._df_row_hashes(df), df['date'].values)
+
+    def _fingerprint_parts(self, parts=None):
+        if parts is None:
+            parts = self._collect_parts()
+        fps = {part: fingerprint.object_fingerprint(parts[part]) for part in CONFIG_PARTS}
+        fps['df'] = self._df_fingerprint(parts['df'])
+        return fps
+
+    def mark_dirty(self, *parts):
+        """标记需要重新保存的部分（用于原地修改session_state中的对象）"""
+        for part in parts or CONFIG_PARTS + ('df',):
+            self._saved_fingerprints.pop(part, None)
+            if part == 'df':
+                self._df_fingerprint_cache = (None, None, None)
+                self._saved_rows = (None, None)
+
+    def dirty_parts(self):
+        """返回自上次保存以来发生变化的部分"""
+        fps = self._fingerprint_parts()
+        return [part for part, fp in fps.items() if self._saved_fingerprints.get(part) != fp]
+
+    def save_user_data(self, force=False):
+        """保存用户数据（只写入发生变化的部分）"""
         if not self.current_user:
             return
 
+        parts = self._collect_parts()
+        fps = self._fingerprint_parts(parts)
+        dirty = [part for part, fp in fps.items() if force or self._saved_fingerprints.get(part) != fp]
+        if not dirty:
+            return
+
         # 保存用户配置
-        user_config = {
-            'user_height': st.session_state.get('user_height', 170.0),
-            'user_sex': st.session_state.get('user_sex', "男"),
-            'user_age': st.session_state.get('user_age', 30),
-            'user_activity_level': st.session_state.get('user_activity_level', "轻度活动"),
-            'target_weight': st.session_state.get('target_weight', None),
-            'target_baseline_weight': st.session_state.get('target_baseline_weight', None),
-            'target_set_date': st.session_state.get('target_set_date', None),
-            'user_training_plan': st.session_state.get('user_training_plan', None),
-            'diet_plan': st.session_state.get('diet_plan', pd.DataFrame())
-        }
+        if any(part in dirty for part in CONFIG_PARTS):
+            user_config = dict(parts['config'])
+            user_config['user_training_plan'] = parts['training_plan']
+            user_config['diet_plan'] = parts['diet_plan']
 
-        config_file = DATA.get_user_config_file(self.current_user)
-        with open(config_file, 'wb') as f:
-            pickle.dump(user_config, f)
+            config_file = DATA.get_user_config_file(self.current_user)
+            with open(config_file, 'wb') as f:
+                pickle.dump(user_config, f)
 
         # 保存健康数据
-        if 'df' in st.session_state:
-            st.session_state.df.to_csv(DATA.get_data_file(self.current_user), index=False)
+        if 'df' in dirty and parts['df'] is not None:
+            self._save_health_data(parts['df'])
+
+        for part in dirty:
+            self._saved_fingerprints[part] = fps[part]
+
+    def _save_health_data(self, df):
+        """保存健康数据：新增/覆盖的记录只追加，其余情况整体重写"""
+        store = storage.get_store()
+        saved_hashes, saved_dates = self._saved_rows
+        suffix = None
+        if store.exists(self.current_user):
+            suffix = health_log.upsert_suffix(saved_hashes, saved_dates, df, self._df_row_hashes(df))
+
+        if suffix is not None:
+            store.append(self.current_user, suffix)
+        else:
+            store.save(self.current_user, df)
+        self._remember_saved_rows(df)
 
 
 # 创建全局用户管理器实例